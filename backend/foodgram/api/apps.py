@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class ApiConfig(AppConfig):
     name = 'api'
+
+    def ready(self):
+        from . import pantry, search  # noqa: F401
+        from .middleware import instrument_serializers
+        instrument_serializers()
@@ -2,6 +2,7 @@ from django_filters.rest_framework import FilterSet, filters
 
 from recipes.models import Ingredient, Recipe, Tag
 from users.models import User
+from .search import search_recipes
 
 
 class IngredientFilter(FilterSet):
@@ -12,6 +13,12 @@ class IngredientFilter(FilterSet):
         fields = ('name',)
 
 
+RECIPE_ORDERINGS = {
+    '-pub_date': ('-pub_date', '-id'),
+    '-favorites_count': ('-favorites_count', '-id'),
+}
+
+
 class TagFilter(FilterSet):
     author = filters.ModelChoiceFilter(queryset=User.objects.all())
     tags = filters.ModelMultipleChoiceFilter(
@@ -23,6 +30,11 @@ class TagFilter(FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_is_in_shopping_cart'
     )
+    search = filters.CharFilter(method='get_search')
+    ordering = filters.ChoiceFilter(
+        choices=[(value, value) for value in RECIPE_ORDERINGS],
+        method='get_ordering'
+    )
 
     class Meta:
         model = Recipe
@@ -37,3 +49,9 @@ class TagFilter(FilterSet):
         if self.request.user.is_authenticated and value is True:
             return queryset.filter(shopping_cart__user=self.request.user)
         return
+
+    def get_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
+
+    def get_ordering(self, queryset, name, value):
+        return queryset.order_by(*RECIPE_ORDERINGS[value])
@@ -0,0 +1,123 @@
+from itertools import islice
+
+from django.db import DatabaseError, connection, transaction
+
+from jobs.registry import enqueue
+from recipes.models import Ingredient, IngredientWithAmount, Recipe, Tag
+from recipes.tasks import (fan_out_recipes, generate_image_variants_batch,
+                           index_similarity)
+from .pantry import pantry_index
+from .search import update_recipe_search_index
+from .serializers import AddRecipeSerializer
+
+DEFAULT_CHUNK_SIZE = 100
+
+
+def get_lookups(items):
+    """Справочники для проверки пачки рецептов: все тэги и ингредиенты,
+    упомянутые хотя бы в одном рецепте, — по одному запросу."""
+    ingredient_ids = set()
+    for item in items:
+        # Элементы неверного вида пропускаются: ошибку по ним
+        # вернёт сериализатор.
+        if not isinstance(item, dict):
+            continue
+        ingredients = item.get('ingredients')
+        if not isinstance(ingredients, list):
+            continue
+        for ingredient in ingredients:
+            try:
+                ingredient_ids.add(int(ingredient['id']))
+            except (KeyError, TypeError, ValueError):
+                continue
+    return {
+        'tag_lookup': Tag.objects.in_bulk(),
+        'ingredient_lookup': Ingredient.objects.in_bulk(ingredient_ids),
+    }
+
+
+def save_recipes(recipes):
+    if connection.features.can_return_ids_from_bulk_insert:
+        Recipe.objects.bulk_create(recipes)
+        return
+    # Без RETURNING bulk_create не проставляет id,
+    # а они нужны для связей с тэгами и ингредиентами.
+    for recipe in recipes:
+        recipe.save()
+
+
+@transaction.atomic
+def insert_chunk(author, validated):
+    recipes = []
+    for data in validated:
+        fields = {
+            name: value for name, value in data.items()
+            if name not in ('tags', 'ingredients')
+        }
+        recipes.append(Recipe(author=author, **fields))
+    save_recipes(recipes)
+    RecipeTag = Recipe.tags.through
+    RecipeTag.objects.bulk_create([
+        RecipeTag(recipe_id=recipe.id, tag_id=tag.id)
+        for recipe, data in zip(recipes, validated)
+        for tag in data['tags']
+    ])
+    IngredientWithAmount.objects.bulk_create([
+        IngredientWithAmount(
+            recipe=recipe,
+            ingredient=ingredient['ingredient'],
+            amount=ingredient['amount']
+        )
+        for recipe, data in zip(recipes, validated)
+        for ingredient in data['ingredients']
+    ])
+    recipe_ids = [recipe.id for recipe in recipes]
+    update_recipe_search_index(recipe_ids)
+    enqueue(generate_image_variants_batch, recipe_ids=recipe_ids)
+    enqueue(fan_out_recipes, recipe_ids=recipe_ids)
+    enqueue(index_similarity, recipe_ids=recipe_ids)
+    # bulk_create не отправляет post_save.
+    transaction.on_commit(pantry_index.invalidate)
+    return recipe_ids
+
+
+def import_chunk(items, author, start):
+    context = get_lookups(items)
+    results = []
+    valid = []
+    for index, item in enumerate(items, start):
+        serializer = AddRecipeSerializer(data=item, context=context)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            results.append({'index': index, 'errors': serializer.errors})
+    if valid:
+        try:
+            recipe_ids = insert_chunk(author, [data for _, data in valid])
+        except DatabaseError as error:
+            results.extend(
+                {'index': index, 'errors': {'non_field_errors': [str(error)]}}
+                for index, _ in valid
+            )
+        else:
+            results.extend(
+                {'index': index, 'id': recipe_id}
+                for (index, _), recipe_id in zip(valid, recipe_ids)
+            )
+    return sorted(results, key=lambda result: result['index'])
+
+
+def import_recipes(items, author, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Проверяет и сохраняет рецепты пачками по chunk_size.
+
+    Каждая пачка пишется в своей транзакции. Возвращает результат
+    по каждому элементу: id созданного рецепта или ошибки.
+    """
+    items = iter(items)
+    start = 0
+    while True:
+        chunk = list(islice(items, chunk_size))
+        if not chunk:
+            return
+        yield from import_chunk(chunk, author, start)
+        start += len(chunk)
@@ -0,0 +1,73 @@
+from recipes import feed
+from recipes.models import (FavoriteRecipe, Ingredient, IngredientWithAmount,
+                            Recipe, ShoppingCart, Tag)
+from users.models import CustomUser, Follow
+
+FIXTURE_PREFIX = 'querycheck'
+
+
+def get_or_create_tags(count=3):
+    tags = list(Tag.objects.all()[:count])
+    for index in range(len(tags), count):
+        tags.append(Tag.objects.create(
+            name=f'{FIXTURE_PREFIX}-tag-{index}',
+            color=f'#{index:06x}',
+            slug=f'{FIXTURE_PREFIX}-tag-{index}',
+        ))
+    return tags
+
+
+def get_or_create_ingredients(count=10):
+    ingredients = list(Ingredient.objects.all()[:count])
+    for index in range(len(ingredients), count):
+        ingredients.append(Ingredient.objects.create(
+            name=f'{FIXTURE_PREFIX}-ingredient-{index}',
+            measurement_unit='г',
+        ))
+    return ingredients
+
+
+def seed(authors=5, recipes_per_author=4, ingredients_per_recipe=5):
+    """Создаёт пользователя с подписками, рецепты, избранное и корзину.
+
+    Возвращает пользователя, от имени которого выполняются запросы.
+    Вызывающий код отвечает за откат транзакции.
+    """
+    tags = get_or_create_tags()
+    ingredients = get_or_create_ingredients(ingredients_per_recipe * 2)
+    reader = CustomUser.objects.create_user(
+        username=f'{FIXTURE_PREFIX}-reader',
+        email=f'{FIXTURE_PREFIX}-reader@example.com',
+        password=FIXTURE_PREFIX,
+    )
+    for author_index in range(authors):
+        author = CustomUser.objects.create_user(
+            username=f'{FIXTURE_PREFIX}-author-{author_index}',
+            email=f'{FIXTURE_PREFIX}-author-{author_index}@example.com',
+            password=FIXTURE_PREFIX,
+        )
+        Follow.objects.create(user=reader, author=author)
+        for recipe_index in range(recipes_per_author):
+            recipe = Recipe.objects.create(
+                author=author,
+                name=f'{FIXTURE_PREFIX}-recipe-{author_index}-{recipe_index}',
+                image='backend_media/querycheck.png',
+                text=FIXTURE_PREFIX,
+                cooking_time=recipe_index + 1,
+            )
+            recipe.tags.set(tags[:recipe_index % len(tags) + 1])
+            IngredientWithAmount.objects.bulk_create([
+                IngredientWithAmount(
+                    recipe=recipe,
+                    ingredient=ingredients[
+                        (recipe_index + offset) % len(ingredients)
+                    ],
+                    amount=offset + 1,
+                )
+                for offset in range(ingredients_per_recipe)
+            ])
+            if recipe_index % 2:
+                FavoriteRecipe.objects.create(user=reader, recipe=recipe)
+                ShoppingCart.objects.create(user=reader, recipe=recipe)
+    feed.rebuild(reader.id)
+    return reader
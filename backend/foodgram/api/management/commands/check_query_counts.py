@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from ._fixtures import seed
+
+ENDPOINTS = (
+    ('/api/recipes/', {}, False),
+    ('/api/recipes/', {}, True),
+    ('/api/users/subscriptions/', {}, True),
+    ('/api/users/subscriptions/', {'recipes_limit': 2}, True),
+    ('/api/recipes/feed/', {}, True),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверяет, что число SQL-запросов списочных эндпоинтов '
+        'не растёт вместе с размером страницы. '
+        'Тестовые данные создаются в транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limits', nargs='+', type=int, default=[1, 10],
+            help='Размеры страниц, для которых сравнивается число запросов'
+        )
+
+    def count_queries(self, client, url, params):
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url, params)
+        if response.status_code != 200:
+            raise CommandError(f'{url}: статус {response.status_code}')
+        return len(context.captured_queries)
+
+    def handle(self, *args, **options):
+        failures = []
+        with transaction.atomic():
+            reader = seed()
+            for url, params, authenticated in ENDPOINTS:
+                client = APIClient()
+                if authenticated:
+                    client.force_authenticate(reader)
+                # Первый запрос прогревает кэши процесса.
+                self.count_queries(client, url, params)
+                counts = [
+                    self.count_queries(
+                        client, url, {**params, 'limit': limit}
+                    )
+                    for limit in options['limits']
+                ]
+                user = 'auth' if authenticated else 'anon'
+                self.stdout.write(f'{url} {params} [{user}]: {counts}')
+                if len(set(counts)) > 1:
+                    failures.append(url)
+            transaction.set_rollback(True)
+        if failures:
+            raise CommandError(
+                'Число запросов зависит от размера страницы: '
+                + ', '.join(failures)
+            )
+        self.stdout.write(self.style.SUCCESS('OK'))
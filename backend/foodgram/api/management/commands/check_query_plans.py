@@ -0,0 +1,253 @@
+import json
+import re
+from collections import defaultdict, namedtuple
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver, get_resolver, resolve
+from rest_framework.test import APIClient
+
+from api.search import update_recipe_search_index
+from jobs.models import Job
+from recipes.models import Ingredient, Recipe, Tag
+from ._fixtures import seed
+
+Route = namedtuple('Route', ('path', 'params', 'authenticated', 'budget'))
+
+# Бюджет — наибольшее допустимое число запросов к базе.
+# В путях подставляются id созданных тестовых объектов.
+ROUTES = (
+    Route('/api/', {}, True, 0),
+    Route('/api/tags/', {}, False, 1),
+    Route('/api/tags/{tag}/', {}, False, 1),
+    Route('/api/ingredients/', {'name': 'а'}, False, 0),
+    Route('/api/ingredients/{ingredient}/', {}, False, 1),
+    Route('/api/recipes/', {}, False, 4),
+    Route('/api/recipes/', {}, True, 5),
+    Route('/api/recipes/', {'cursor': ''}, True, 4),
+    Route('/api/recipes/', {'ordering': '-favorites_count'}, True, 5),
+    Route('/api/recipes/', {'search': 'querycheck'}, True, 6),
+    # Фильтры по тэгу и автору проверяют значение отдельным запросом.
+    Route('/api/recipes/', {'tags': '{tag_slug}'}, True, 6),
+    Route('/api/recipes/', {'author': '{author}'}, True, 6),
+    Route('/api/recipes/', {'is_favorited': 1}, True, 5),
+    Route('/api/recipes/', {'is_in_shopping_cart': 1}, True, 5),
+    Route('/api/recipes/{recipe}/', {}, True, 4),
+    Route('/api/recipes/{recipe}/similar/', {}, True, 2),
+    # Лента читает подписки на авторов с fan-out on read.
+    Route('/api/recipes/feed/', {}, True, 6),
+    Route('/api/recipes/trending/', {}, True, 4),
+    Route('/api/recipes/pantry/', {'ingredients': '{ingredient}'}, True, 4),
+    Route(
+        '/api/recipes/download_shopping_cart/', {'format': 'txt'}, True, 1
+    ),
+    Route('/api/jobs/{job}/', {}, True, 1),
+    Route('/api/users/', {}, True, 3),
+    Route('/api/users/{author}/', {}, True, 2),
+    Route('/api/users/me/', {}, True, 0),
+    Route('/api/users/subscriptions/', {}, True, 3),
+    Route('/api/users/subscriptions/', {'recipes_limit': 2}, True, 3),
+)
+
+SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)')
+SQLITE_INDEX = re.compile(
+    r'USING (?:COVERING )?INDEX|USING INTEGER PRIMARY KEY'
+)
+
+
+def iter_routes(patterns, prefix=''):
+    """Маршруты в том виде, в каком их отдаёт ResolverMatch.route."""
+    for pattern in patterns:
+        route = prefix + str(pattern.pattern).lstrip('^')
+        if isinstance(pattern, URLResolver):
+            yield from iter_routes(pattern.url_patterns, route)
+        else:
+            yield route, pattern.callback
+
+
+def handles_get(callback):
+    actions = getattr(callback, 'actions', None)
+    if actions is not None:
+        return 'get' in actions
+    return hasattr(getattr(callback, 'cls', callback), 'get')
+
+
+def get_full_scans(sql):
+    """Таблицы, которые план запроса читает целиком."""
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            details = [row[-1] for row in cursor.fetchall()]
+        # Чтение по индексу с LIMIT SQLite тоже называет SCAN, но тогда
+        # в плане указан индекс, и чтение останавливается на первых
+        # строках.
+        return {
+            match.group(1) for match in map(SQLITE_SCAN.match, details)
+            if match and not SQLITE_INDEX.search(match.string)
+            and 'VIRTUAL TABLE' not in match.string
+        }
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        tables = set()
+        nodes = [plan[0]['Plan']]
+        while nodes:
+            node = nodes.pop()
+            if node['Node Type'] == 'Seq Scan':
+                tables.add(node['Relation Name'])
+            nodes.extend(node.get('Plans', ()))
+        return tables
+    return set()
+
+
+def get_index_columns(sql, table):
+    """Столбцы таблицы из условий и сортировки запроса — кандидаты
+    в индекс, который позволил бы обойтись без полного чтения."""
+    columns = re.findall(
+        rf'"{table}"\."(\w+)"\s*(?:=|<|>|IN\b|IS\b)', sql
+    )
+    order_by = sql.rpartition(' ORDER BY ')[2] if ' ORDER BY ' in sql else ''
+    columns += re.findall(rf'"{table}"\."(\w+)"', order_by)
+    return tuple(dict.fromkeys(columns))
+
+
+class Command(BaseCommand):
+    help = (
+        'Проходит по GET-маршрутам API на тестовых данных, выполняет '
+        'EXPLAIN для каждого запроса и сообщает о полных чтениях больших '
+        'таблиц, превышении бюджета запросов и непокрытых маршрутах. '
+        'Тестовые данные создаются в транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-rows', type=int, default=1000,
+            help='С какого числа строк таблица считается большой'
+        )
+        parser.add_argument(
+            '--authors', type=int, default=20,
+            help='Число авторов в тестовых данных'
+        )
+        parser.add_argument(
+            '--recipes-per-author', type=int,
+            help='Число рецептов у каждого автора. По умолчанию рецептов '
+                 'создаётся не меньше --min-rows, иначе полное чтение '
+                 'таблицы рецептов не будет замечено'
+        )
+
+    def get_row_count(self, table):
+        """Число строк таблицы; 0 для подзапросов и псевдонимов."""
+        if table not in self.tables:
+            return 0
+        if table not in self.row_counts:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT COUNT(*) FROM {}'.format(
+                        connection.ops.quote_name(table)
+                    )
+                )
+                self.row_counts[table] = cursor.fetchone()[0]
+        return self.row_counts[table]
+
+    def get_objects(self, reader):
+        update_recipe_search_index(Recipe.objects.values_list('id', flat=True))
+        recipe = Recipe.objects.filter(author__following__user=reader).first()
+        tag = Tag.objects.first()
+        return {
+            'tag': tag.id,
+            'tag_slug': tag.slug,
+            'ingredient': Ingredient.objects.values_list(
+                'id', flat=True
+            ).first(),
+            'recipe': recipe.id,
+            'author': recipe.author_id,
+            'job': Job.objects.create(name='querycheck', user=reader).id,
+        }
+
+    def request(self, client, path, params):
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(path, params)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        if response.status_code != 200:
+            raise CommandError(f'{path}: статус {response.status_code}')
+        return [
+            query['sql'] for query in context.captured_queries
+            if query['sql'].lstrip().upper().startswith('SELECT')
+        ]
+
+    def check_coverage(self, routes):
+        covered = {resolve(route.path).route for route in routes}
+        return [
+            f'{route}: маршрут не проверяется'
+            for route, callback in iter_routes(get_resolver().url_patterns)
+            if route.startswith('api/') and '(?P<format>' not in route
+            and handles_get(callback) and route not in covered
+        ]
+
+    def check_route(self, route, reader, min_rows):
+        client = APIClient()
+        if route.authenticated:
+            client.force_authenticate(reader)
+        # Первый запрос прогревает кэши процесса.
+        self.request(client, route.path, route.params)
+        queries = self.request(client, route.path, route.params)
+        user = 'auth' if route.authenticated else 'anon'
+        label = f'{route.path} {route.params} [{user}]'
+        self.stdout.write(f'{label}: {len(queries)} из {route.budget}')
+        failures = []
+        if len(queries) > route.budget:
+            failures.append(
+                f'{label}: {len(queries)} запросов при бюджете {route.budget}'
+            )
+        for sql in queries:
+            for table in get_full_scans(sql):
+                if self.get_row_count(table) < min_rows:
+                    continue
+                failures.append(f'{label}: полное чтение {table}\n    {sql}')
+                columns = get_index_columns(sql, table)
+                if columns:
+                    self.recommendations[table].add(columns)
+        return failures
+
+    def handle(self, *args, **options):
+        self.tables = set(connection.introspection.table_names())
+        self.row_counts = {}
+        self.recommendations = defaultdict(set)
+        authors = options['authors']
+        recipes_per_author = options['recipes_per_author'] or -(
+            -options['min_rows'] // authors
+        )
+        with transaction.atomic():
+            reader = seed(
+                authors=authors, recipes_per_author=recipes_per_author
+            )
+            objects = self.get_objects(reader)
+            routes = [
+                route._replace(
+                    path=route.path.format(**objects),
+                    params={
+                        name: str(value).format(**objects)
+                        for name, value in route.params.items()
+                    }
+                )
+                for route in ROUTES
+            ]
+            failures = self.check_coverage(routes)
+            for route in routes:
+                failures += self.check_route(
+                    route, reader, options['min_rows']
+                )
+            transaction.set_rollback(True)
+        for table, indexes in sorted(self.recommendations.items()):
+            for columns in sorted(indexes):
+                self.stdout.write(
+                    f'Рекомендуемый индекс: {table}({", ".join(columns)})'
+                )
+        if failures:
+            raise CommandError('\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('OK'))
@@ -0,0 +1,67 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.importers import DEFAULT_CHUNK_SIZE, import_recipes
+from recipes.loaders import read_json
+from users.models import CustomUser
+
+
+def read_ndjson(file):
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+READERS = {
+    '.json': read_json,
+    '.ndjson': read_ndjson,
+    '.jsonl': read_ndjson,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Импортирует рецепты из JSON-массива или NDJSON. Формат элемента '
+        'тот же, что у POST /api/recipes/, картинка — в base64.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к .json или .ndjson файлу')
+        parser.add_argument(
+            '--author', required=True, help='Email автора рецептов'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+            help='Число рецептов в одной транзакции'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        reader = READERS.get(os.path.splitext(path)[1].lower())
+        if reader is None:
+            raise CommandError('Поддерживаются только файлы .json и .ndjson')
+        try:
+            author = CustomUser.objects.get(email=options['author'])
+        except CustomUser.DoesNotExist:
+            raise CommandError('Автор не найден')
+        created = failed = 0
+        try:
+            with open(path, encoding='utf-8') as file:
+                results = import_recipes(
+                    reader(file), author, options['chunk_size']
+                )
+                for result in results:
+                    if 'id' in result:
+                        created += 1
+                        continue
+                    failed += 1
+                    self.stderr.write(
+                        f'#{result["index"]}: {result["errors"]}'
+                    )
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано: {created}, с ошибками: {failed}'
+        ))
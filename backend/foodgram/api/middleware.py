@@ -0,0 +1,177 @@
+import json
+import logging
+import threading
+import time
+from contextlib import ExitStack
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+from rest_framework.serializers import BaseSerializer
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+class RequestMetrics:
+    """Запросы к базе и время сериализации одного HTTP-запроса."""
+
+    def __init__(self):
+        self.view = None
+        self.queries = []
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializing = False
+
+    def execute(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.db_time += duration
+            self.queries.append((duration, sql))
+
+    def get_slowest(self, count):
+        return sorted(self.queries, key=lambda query: -query[0])[:count]
+
+
+def get_metrics():
+    return getattr(_local, 'metrics', None)
+
+
+def timed_serializer_data(data):
+    """Считает время построения serializer.data верхнего уровня.
+
+    Вложенные сериализаторы не учитываются повторно. Запросы к базе,
+    выполненные из сериализатора, входят и во время базы.
+    """
+    @wraps(data)
+    def wrapper(serializer):
+        metrics = get_metrics()
+        if metrics is None or metrics.serializing:
+            return data(serializer)
+        metrics.serializing = True
+        start = time.perf_counter()
+        try:
+            return data(serializer)
+        finally:
+            metrics.serializer_time += time.perf_counter() - start
+            metrics.serializing = False
+    return wrapper
+
+
+def instrument_serializers():
+    fget = BaseSerializer.data.fget
+    if not hasattr(fget, '__wrapped__'):
+        BaseSerializer.data = property(timed_serializer_data(fget))
+
+
+def get_view_name(view_func, method):
+    """RecipeViewSet.list для DRF, модуль.функция для остальных."""
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(method.lower(), method.lower())
+    return f'{view_class.__name__}.{action}'
+
+
+def format_server_timing(metrics, total):
+    return ', '.join((
+        f'db;dur={metrics.db_time * 1000:.1f};'
+        f'desc="SQL ({len(metrics.queries)})"',
+        f'serialize;dur={metrics.serializer_time * 1000:.1f}',
+        f'total;dur={total * 1000:.1f}',
+    ))
+
+
+class RequestTimingMiddleware:
+    """Число и время SQL-запросов, время сериализации и общее время.
+
+    Добавляет заголовок Server-Timing и пишет строку JSON в лог
+    с именем DRF-вью и действия: в обычной строке только счётчики
+    и время, текст SQL — самые долгие запросы и полный список — только
+    в предупреждении о запросах дольше SLOW_REQUEST_THRESHOLD
+    миллисекунд.
+
+    Тело потокового ответа формируется уже после выхода из middleware,
+    поэтому для него замер завершается в response.close(): лог учитывает
+    запросы, выполненные при отдаче тела, а Server-Timing, отправленный
+    до тела, — только работу вью.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = _local.metrics = RequestMetrics()
+        start = time.perf_counter()
+        stack = ExitStack()
+        try:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(metrics.execute)
+                )
+            response = self.get_response(request)
+        except BaseException:
+            self.stop(stack)
+            raise
+        response['Server-Timing'] = format_server_timing(
+            metrics, time.perf_counter() - start
+        )
+        if not response.streaming:
+            self.stop(stack)
+            self.log(request, response, metrics, time.perf_counter() - start)
+            return response
+        close = response.close
+
+        def close_and_log():
+            response.close = close
+            try:
+                close()
+            finally:
+                self.stop(stack)
+                self.log(
+                    request, response, metrics, time.perf_counter() - start
+                )
+
+        response.close = close_and_log
+        return response
+
+    def stop(self, stack):
+        stack.close()
+        _local.metrics = None
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = get_metrics()
+        if metrics is not None:
+            metrics.view = get_view_name(view_func, request.method)
+
+    def log(self, request, response, metrics, total):
+        record = {
+            'view': metrics.view,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(total * 1000, 1),
+            'db_ms': round(metrics.db_time * 1000, 1),
+            'queries': len(metrics.queries),
+            'serializer_ms': round(metrics.serializer_time * 1000, 1),
+        }
+        threshold = settings.SLOW_REQUEST_THRESHOLD
+        if threshold is None or total * 1000 < threshold:
+            logger.info(json.dumps(record, ensure_ascii=False))
+            return
+        record['slowest'] = [
+            {'ms': round(duration * 1000, 1), 'sql': sql}
+            for duration, sql in metrics.get_slowest(
+                settings.REQUEST_TIMING_SLOWEST
+            )
+        ]
+        record['trace'] = [
+            {'ms': round(duration * 1000, 1), 'sql': sql}
+            for duration, sql in metrics.queries
+        ]
+        logger.warning(json.dumps(record, ensure_ascii=False))
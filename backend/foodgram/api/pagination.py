@@ -1,6 +1,199 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import binascii
+import json
+from collections import OrderedDict, namedtuple
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from recipes.models import FeedEntry
+
+FeedPosition = namedtuple('FeedPosition', ('pub_date', 'recipe_id'))
+
+
+class RecipePaginator(Paginator):
+    """Считает COUNT(*) без аннотаций-флагов, нужных только для вывода.
+
+    С ними Django оборачивает подсчёт в подзапрос и вычисляет флаги
+    для каждой строки таблицы.
+    """
+    output_annotations = ('is_favorited', 'is_in_shopping_cart')
+
+    @cached_property
+    def count(self):
+        query = self.object_list.query.chain()
+        for name in self.output_annotations:
+            query.annotations.pop(name, None)
+        return query.get_count(using=self.object_list.db)
 
 
 class CustomPageNumberPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
+
+
+class KeysetPagination(BasePagination):
+    """Пагинация по курсору без COUNT(*) и OFFSET.
+
+    Записи упорядочиваются по убыванию полей ordering, следующая страница
+    начинается строго после последней записи текущей.
+    """
+    ordering = ('id',)
+    page_size = CustomPageNumberPagination.page_size
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор'
+
+    def get_ordering(self, request):
+        return self.ordering
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def encode_cursor(self, obj):
+        position = [getattr(obj, field) for field in self.ordering]
+        data = json.dumps(position, default=str).encode()
+        return base64.urlsafe_b64encode(data).decode()
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            if len(position) != len(self.ordering):
+                raise ValueError
+            return [
+                model._meta.get_field(field).to_python(value)
+                for field, value in zip(self.ordering, position)
+            ]
+        except (TypeError, ValueError, binascii.Error, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_seek_filter(self, position):
+        """Условие (a, b) < (x, y), раскрытое для любой СУБД."""
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, position):
+            condition |= Q(**equal, **{f'{field}__lt': value})
+            equal[field] = value
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = self.get_ordering(request)
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(
+            *(f'-{field}' for field in self.ordering)
+        )
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.get_seek_filter(position))
+        page = list(queryset[:page_size + 1])
+        self.has_next = len(page) > page_size
+        self.page = page[:page_size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.page[-1])
+        )
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data)
+        ]))
+
+
+class RecipeKeysetPagination(KeysetPagination):
+    ordering = ('pub_date', 'id')
+    orderings = {
+        '-favorites_count': ('favorites_count', 'id'),
+    }
+
+    def get_ordering(self, request):
+        return self.orderings.get(
+            request.query_params.get('ordering'), self.ordering
+        )
+
+
+class OptionalKeysetPagination(CustomPageNumberPagination):
+    """Постраничная пагинация, которая переключается на курсорную,
+    если в запросе есть параметр cursor (пустой — первая страница)."""
+    keyset_pagination_class = KeysetPagination
+
+    def use_keyset(self, request, keyset_paginator):
+        return keyset_paginator.cursor_query_param in request.query_params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset_paginator = None
+        keyset_paginator = self.keyset_pagination_class()
+        if self.use_keyset(request, keyset_paginator):
+            self.keyset_paginator = keyset_paginator
+            return keyset_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset_paginator is not None:
+            return self.keyset_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class RecipePagination(OptionalKeysetPagination):
+    """Результаты поиска всегда постраничные: курсор упорядочивает
+    по дате и перебил бы сортировку по релевантности. Выдача поиска
+    ограничена RECIPE_SEARCH_LIMIT, так что OFFSET здесь дешёвый."""
+    django_paginator_class = RecipePaginator
+    keyset_pagination_class = RecipeKeysetPagination
+    search_query_param = 'search'
+
+    def use_keyset(self, request, keyset_paginator):
+        if request.query_params.get(self.search_query_param):
+            return False
+        return super().use_keyset(request, keyset_paginator)
+
+
+class FeedPagination(KeysetPagination):
+    """Курсорная пагинация ленты из нескольких источников.
+
+    Из каждого источника читается не больше страницы плюс одна строка,
+    поэтому стоимость чтения не зависит от числа подписок.
+    """
+    ordering = ('pub_date', 'recipe_id')
+
+    def paginate_sources(self, sources, request):
+        self.request = request
+        page_size = self.get_page_size(request)
+        position = self.decode_cursor(request, FeedEntry)
+        rows = set()
+        for source in sources:
+            source = source.order_by(
+                *(f'-{field}' for field in self.ordering)
+            )
+            if position is not None:
+                source = source.filter(self.get_seek_filter(position))
+            rows.update(source.values_list(*self.ordering)[:page_size + 1])
+        page = sorted(rows, reverse=True)
+        self.has_next = len(page) > page_size
+        self.page = [FeedPosition(*row) for row in page[:page_size]]
+        return self.page
@@ -0,0 +1,244 @@
+import threading
+import time
+from array import array
+from collections import defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.models import IngredientWithAmount, Recipe
+
+
+def to_bitset(positions, size):
+    data = bytearray((size + 7) // 8)
+    for position in positions:
+        data[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(data, 'little')
+
+
+def compress(positions, size):
+    """Частые значения хранятся битовым множеством, редкие — массивом
+    позиций: 4 байта на рецепт против size / 8 байт на множество."""
+    if len(positions) * 32 > size:
+        return to_bitset(positions, size)
+    return array('I', positions)
+
+
+def to_mask(entry, size):
+    if isinstance(entry, int):
+        return entry
+    return to_bitset(entry, size)
+
+
+def popcount(bitset):
+    return bin(bitset).count('1')
+
+
+def iter_positions_desc(bitset):
+    while bitset:
+        position = bitset.bit_length() - 1
+        yield position
+        bitset ^= 1 << position
+
+
+def add_to_counters(counters, bitset):
+    """Прибавляет единицу во всех позициях bitset к битовым срезам
+    счётчиков: counters[k] — k-й разряд счётчика каждого рецепта."""
+    carry = bitset
+    for index, counter in enumerate(counters):
+        if not carry:
+            return
+        counters[index] = counter ^ carry
+        carry &= counter
+    if carry:
+        counters.append(carry)
+
+
+def get_equal(counters, candidates, value):
+    """Позиции из candidates, где счётчик равен value."""
+    result = candidates
+    for index, counter in enumerate(counters):
+        result &= counter if value >> index & 1 else ~counter
+    return result
+
+
+class PantryMatches:
+    """Результат подбора, упорядоченный по группам (найдено, всего).
+
+    Группы — битовые множества, поэтому число результатов считается
+    без перебора, а для страницы перебираются только её позиции.
+    """
+
+    def __init__(self, groups, recipe_ids, total):
+        self.groups = groups
+        self.recipe_ids = recipe_ids
+        self.total = total
+
+    def __len__(self):
+        return self.total
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        stop = self.total if key.stop is None else key.stop
+        result = []
+        for found, size, bitset in self.groups:
+            if len(result) >= stop:
+                break
+            for position in islice(
+                iter_positions_desc(bitset), stop - len(result)
+            ):
+                result.append((self.recipe_ids[position], found, size))
+        return result[key]
+
+
+class PantryIndex:
+    """Инвертированный индекс рецептов в памяти процесса.
+
+    Каждому ингредиенту, тэгу и автору соответствует множество позиций
+    рецептов: битовое (целое число, бит — позиция рецепта) или, если
+    рецептов мало, массив позиций, который превращается в битовое
+    множество только на время запроса. Индекс строится
+    при первом обращении, сбрасывается после изменения рецептов в этом
+    процессе и перестраивается по истечении PANTRY_INDEX_TTL.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+        self._built_at = 0
+
+    def invalidate(self):
+        self._index = None
+
+    def is_fresh(self, index):
+        age = time.monotonic() - self._built_at
+        return index is not None and age < settings.PANTRY_INDEX_TTL
+
+    def build(self):
+        recipes = list(Recipe.objects.order_by('id').values_list(
+            'id', 'author_id'
+        ))
+        positions = {pk: position for position, (pk, _) in enumerate(recipes)}
+        size = len(recipes)
+        sizes = array('H', bytes(2 * size))
+        by_ingredient = defaultdict(list)
+        rows = IngredientWithAmount.objects.values_list(
+            'recipe_id', 'ingredient_id'
+        )
+        for recipe_id, ingredient_id in rows.iterator():
+            position = positions[recipe_id]
+            by_ingredient[ingredient_id].append(position)
+            sizes[position] += 1
+        by_tag = defaultdict(list)
+        for recipe_id, tag_id in Recipe.tags.through.objects.values_list(
+            'recipe_id', 'tag_id'
+        ).iterator():
+            by_tag[tag_id].append(positions[recipe_id])
+        by_author = defaultdict(list)
+        by_size = defaultdict(list)
+        for position, (_, author_id) in enumerate(recipes):
+            by_author[author_id].append(position)
+            by_size[sizes[position]].append(position)
+        by_size.pop(0, None)
+        return {
+            'recipe_ids': array('q', (pk for pk, _ in recipes)),
+            'size': size,
+            'sizes': {
+                pk: compress(items, size) for pk, items in by_size.items()
+            },
+            'ingredients': {
+                pk: compress(items, size)
+                for pk, items in by_ingredient.items()
+            },
+            'tags': {
+                pk: compress(items, size) for pk, items in by_tag.items()
+            },
+            'authors': {
+                pk: compress(items, size) for pk, items in by_author.items()
+            },
+        }
+
+    def get_index(self):
+        index = self._index
+        if not self.is_fresh(index):
+            with self._lock:
+                index = self._index
+                if not self.is_fresh(index):
+                    index = self._index = self.build()
+                    self._built_at = time.monotonic()
+        return index
+
+    def get_bitset(self, index, kind, pk):
+        return to_mask(index[kind].get(pk, ()), index['size'])
+
+    def get_mask(self, index, tag_ids, author_id):
+        mask = (1 << index['size']) - 1
+        if tag_ids:
+            tags = 0
+            for pk in tag_ids:
+                tags |= self.get_bitset(index, 'tags', pk)
+            mask &= tags
+        if author_id is not None:
+            mask &= self.get_bitset(index, 'authors', author_id)
+        return mask
+
+    def get_groups(self, index, counters, candidates, count):
+        """Группы (найдено, всего, битовое множество) по убыванию доли
+        найденных ингредиентов, затем числа найденных."""
+        sizes = {
+            size: to_mask(entry, index['size']) & candidates
+            for size, entry in index['sizes'].items()
+        }
+        groups = []
+        for found in range(1, min(count, 2 ** len(counters) - 1) + 1):
+            equal = get_equal(counters, candidates, found)
+            if not equal:
+                continue
+            for size, bitset in sizes.items():
+                if size < found or not bitset:
+                    continue
+                group = equal & bitset
+                if group:
+                    groups.append((found, size, group))
+        groups.sort(key=lambda group: (-group[0] / group[1], -group[0]))
+        return groups
+
+    def match(self, ingredient_ids, tag_ids=(), author_id=None):
+        """Рецепты, где есть хотя бы один из ингредиентов, по убыванию
+        доли имеющихся ингредиентов рецепта, затем по убыванию id.
+
+        Возвращает последовательность кортежей (id рецепта, найдено,
+        всего ингредиентов) с len() и срезами. Счётчики совпадений
+        считаются сразу для всех рецептов побитовым сложением множеств
+        ингредиентов, рецепты группируются по значению счётчика
+        побитовыми операциями над его разрядами.
+        """
+        index = self.get_index()
+        mask = self.get_mask(index, tag_ids, author_id)
+        counters = []
+        candidates = 0
+        ingredient_ids = set(ingredient_ids)
+        for pk in ingredient_ids:
+            bitset = self.get_bitset(index, 'ingredients', pk) & mask
+            candidates |= bitset
+            add_to_counters(counters, bitset)
+        groups = self.get_groups(
+            index, counters, candidates, len(ingredient_ids)
+        )
+        return PantryMatches(
+            groups, index['recipe_ids'], popcount(candidates)
+        )
+
+
+pantry_index = PantryIndex()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_pantry_index(**kwargs):
+    transaction.on_commit(pantry_index.invalidate)
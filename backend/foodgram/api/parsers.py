@@ -0,0 +1,68 @@
+import codecs
+import json
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from rest_framework.exceptions import ParseError, ValidationError
+from rest_framework.parsers import BaseParser, MultiPartParser
+
+
+def get_file_too_large_message():
+    limit = settings.RECIPE_IMAGE_MAX_SIZE / (1024 * 1024)
+    return f'Размер файла не должен превышать {limit:g} МБ'
+
+
+def file_too_large(field_name):
+    return ValidationError({field_name: [get_file_too_large_message()]})
+
+
+class LimitedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """Пишет файл во временный файл на диске и прерывает загрузку,
+    как только прочитано больше RECIPE_IMAGE_MAX_SIZE байт."""
+
+    def handle_raw_input(self, input_data, META, content_length, boundary,
+                         encoding=None):
+        max_body = (
+            settings.RECIPE_IMAGE_MAX_SIZE
+            + settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+        )
+        if content_length > max_body:
+            raise file_too_large('image')
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.RECIPE_IMAGE_MAX_SIZE:
+            self.file.close()
+            raise file_too_large(self.field_name)
+        return super().receive_data_chunk(raw_data, start)
+
+
+class LimitedMultiPartParser(MultiPartParser):
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context['request']
+        request.upload_handlers = [
+            LimitedTemporaryFileUploadHandler(request)
+        ]
+        return super().parse(stream, media_type, parser_context)
+
+
+class NDJSONParser(BaseParser):
+    """Тело из JSON-объектов по одному на строку."""
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            return [
+                json.loads(line)
+                for line in codecs.getreader(encoding)(stream)
+                if line.strip()
+            ]
+        except ValueError as error:
+            raise ParseError(f'NDJSON parse error - {error}')
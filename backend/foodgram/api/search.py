@@ -0,0 +1,215 @@
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, IntegerField, Q, When
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.models import Ingredient, IngredientWithAmount, Recipe
+
+INGREDIENT_NAMES_SQL = (
+    'SELECT {aggregate} FROM recipes_ingredientwithamount amount '
+    'JOIN recipes_ingredient ingredient '
+    'ON ingredient.id = amount.ingredient_id '
+    'WHERE amount.recipe_id = recipes_recipe.id'
+)
+
+SQLITE_DELETE_SQL = 'DELETE FROM recipes_recipe_fts WHERE rowid IN ({ids})'
+
+SQLITE_INSERT_SQL = (
+    'INSERT INTO recipes_recipe_fts(rowid, name, ingredients, text) '
+    'SELECT id, name, ({ingredients}), text FROM recipes_recipe '
+    'WHERE id IN ({{ids}})'
+).format(ingredients=INGREDIENT_NAMES_SQL.format(
+    aggregate="group_concat(ingredient.name, ' ')"
+))
+
+SQLITE_SEARCH_SQL = (
+    'SELECT rowid FROM recipes_recipe_fts '
+    'WHERE recipes_recipe_fts MATCH %s '
+    'ORDER BY bm25(recipes_recipe_fts, 10.0, 5.0, 1.0) LIMIT %s'
+)
+
+POSTGRESQL_UPDATE_SQL = (
+    "UPDATE recipes_recipe SET search_vector = "
+    "setweight(to_tsvector('russian', name), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(({ingredients}), '')), 'B') "
+    "|| setweight(to_tsvector('russian', text), 'C') "
+    "WHERE id = ANY(%s)"
+).format(ingredients=INGREDIENT_NAMES_SQL.format(
+    aggregate="string_agg(ingredient.name, ' ')"
+))
+
+POSTGRESQL_SEARCH_SQL = (
+    "SELECT id FROM recipes_recipe, "
+    "websearch_to_tsquery('russian', %s) query "
+    "WHERE search_vector @@ query "
+    "ORDER BY ts_rank(search_vector, query) DESC LIMIT %s"
+)
+
+
+def normalize(value):
+    """Приводит строку к виду для сравнения без учёта регистра и ё/е."""
+    return unicodedata.normalize('NFKC', value).casefold().replace('ё', 'е')
+
+
+class IngredientIndex:
+    """Индекс справочника ингредиентов в памяти процесса.
+
+    Строится при первом обращении, сбрасывается при изменении
+    ингредиентов в этом процессе и перестраивается по истечении
+    INGREDIENT_INDEX_TTL, чтобы подхватить изменения других воркеров.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+        self._built_at = 0
+
+    def invalidate(self):
+        self._index = None
+
+    def is_fresh(self, index):
+        age = time.monotonic() - self._built_at
+        return index is not None and age < settings.INGREDIENT_INDEX_TTL
+
+    def build(self):
+        entries = sorted(
+            (normalize(name), pk, name, measurement_unit)
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        )
+        keys = [key for key, *_ in entries]
+        items = [
+            {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+            for _, pk, name, measurement_unit in entries
+        ]
+        return keys, items
+
+    def get_index(self):
+        index = self._index
+        if not self.is_fresh(index):
+            with self._lock:
+                index = self._index
+                if not self.is_fresh(index):
+                    index = self._index = self.build()
+                    self._built_at = time.monotonic()
+        return index
+
+    def search(self, query, limit=None):
+        """Сначала совпадения по началу названия, затем по подстроке."""
+        keys, items = self.get_index()
+        limit = limit or settings.INGREDIENT_SEARCH_LIMIT
+        query = normalize(query)
+        start = bisect_left(keys, query)
+        end = start
+        while end < len(keys) and end - start < limit and (
+            keys[end].startswith(query)
+        ):
+            end += 1
+        result = items[start:end]
+        if len(result) < limit:
+            for key, item in zip(keys, items):
+                if query in key and not key.startswith(query):
+                    result.append(item)
+                    if len(result) == limit:
+                        break
+        return result
+
+
+ingredient_index = IngredientIndex()
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredient_index(**kwargs):
+    ingredient_index.invalidate()
+
+
+def update_recipe_search_index(recipe_ids):
+    """Пересчитывает полнотекстовый индекс для переданных рецептов."""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            placeholders = ', '.join(['%s'] * len(recipe_ids))
+            cursor.execute(
+                SQLITE_DELETE_SQL.format(ids=placeholders), recipe_ids
+            )
+            cursor.execute(
+                SQLITE_INSERT_SQL.format(ids=placeholders), recipe_ids
+            )
+        elif connection.vendor == 'postgresql':
+            cursor.execute(POSTGRESQL_UPDATE_SQL, [recipe_ids])
+
+
+def find_recipe_ids(query):
+    """Возвращает id рецептов, упорядоченные по релевантности."""
+    limit = settings.RECIPE_SEARCH_LIMIT
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            words = re.findall(r'\w+', query)
+            if not words:
+                return []
+            match = ' '.join('"{}"*'.format(word) for word in words)
+            cursor.execute(SQLITE_SEARCH_SQL, [match, limit])
+        else:
+            cursor.execute(POSTGRESQL_SEARCH_SQL, [query, limit])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_recipes(queryset, query):
+    if connection.vendor not in ('sqlite', 'postgresql'):
+        return queryset.filter(
+            Q(name__icontains=query)
+            | Q(text__icontains=query)
+            | Q(ingredients__name__icontains=query)
+        ).distinct()
+    recipe_ids = find_recipe_ids(query)
+    relevance = Case(
+        *[When(id=pk, then=position)
+          for position, pk in enumerate(recipe_ids)],
+        output_field=IntegerField()
+    )
+    return queryset.filter(id__in=recipe_ids).order_by(relevance)
+
+
+def schedule_search_index_update(recipe_ids):
+    """Обновляет индекс после фиксации транзакции, когда состав
+    рецепта уже записан."""
+    transaction.on_commit(lambda: update_recipe_search_index(recipe_ids))
+
+
+@receiver(post_save, sender=Recipe)
+def index_saved_recipe(instance, **kwargs):
+    schedule_search_index_update([instance.pk])
+
+
+@receiver(post_save, sender=IngredientWithAmount)
+@receiver(post_delete, sender=IngredientWithAmount)
+def index_recipe_ingredients(instance, **kwargs):
+    schedule_search_index_update([instance.recipe_id])
+
+
+@receiver(post_save, sender=Ingredient)
+def index_renamed_ingredient(instance, created, **kwargs):
+    if not created:
+        schedule_search_index_update(list(
+            IngredientWithAmount.objects.filter(
+                ingredient=instance
+            ).values_list('recipe_id', flat=True)
+        ))
+
+
+@receiver(post_delete, sender=Recipe)
+def delete_recipe_search_index(instance, **kwargs):
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(SQLITE_DELETE_SQL.format(ids='%s'), [instance.id])
@@ -1,11 +1,31 @@
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
 from django.db import transaction
 from djoser.serializers import UserSerializer
 from drf_extra_fields.fields import Base64ImageField
+from PIL import Image
 from rest_framework import serializers, validators
 
+from jobs.models import Job
+from jobs.registry import enqueue
+from recipes.images import FORMATS, VARIANT_WIDTHS, variant_name
 from recipes.models import (FavoriteRecipe, Ingredient, IngredientWithAmount,
-                            Recipe, ShoppingCart, Tag)
+                            Recipe, ShoppingCart, ShoppingListItem, Tag)
+from recipes.tasks import (fan_out_recipes, generate_image_variants,
+                           index_similarity)
 from users.models import CustomUser, Follow
+from .parsers import get_file_too_large_message
+
+
+def set_prefetched(instance, name, objects):
+    """Кладёт уже загруженные объекты в кеш prefetch_related, чтобы
+    instance.<name>.all() не обращался к базе."""
+    queryset = getattr(instance, name).all()
+    queryset._result_cache = list(objects)
+    queryset._prefetch_done = True
+    if not hasattr(instance, '_prefetched_objects_cache'):
+        instance._prefetched_objects_cache = {}
+    instance._prefetched_objects_cache[name] = queryset
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -23,6 +43,73 @@ class TagField(serializers.SlugRelatedField):
         return serializer.data
 
 
+class ImageVariantsField(serializers.ReadOnlyField):
+    """Отдаёт уменьшенные копии картинки рецепта в формате атрибута
+    srcset. Пока копии не созданы, отдаёт None."""
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        value = recipe.image
+        if not value or recipe.image_variants != value.name:
+            return None
+        request = self.context.get('request')
+        srcset = {}
+        for extension in FORMATS:
+            urls = []
+            for variant, width in VARIANT_WIDTHS.items():
+                url = value.storage.url(
+                    variant_name(value.name, variant, extension)
+                )
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                urls.append(f'{url} {width}w')
+            srcset[extension] = ', '.join(urls)
+        return srcset
+
+
+class HeaderCheckedImageField(serializers.ImageField):
+    """Проверяет размер файла и картинки по заголовку до полной
+    проверки изображения Pillow."""
+
+    def validate_image_header(self, data):
+        if data.size > settings.RECIPE_IMAGE_MAX_SIZE:
+            raise serializers.ValidationError(get_file_too_large_message())
+        try:
+            width, height = Image.open(data).size
+        except (OSError, ValueError):
+            raise serializers.ValidationError('Загрузите корректную картинку')
+        finally:
+            data.seek(0)
+        max_dimension = settings.RECIPE_IMAGE_MAX_DIMENSION
+        if width > max_dimension or height > max_dimension:
+            raise serializers.ValidationError(
+                f'Стороны картинки не должны превышать {max_dimension} px'
+            )
+
+    def to_internal_value(self, data):
+        if isinstance(data, UploadedFile):
+            self.validate_image_header(data)
+        return super().to_internal_value(data)
+
+
+class RecipeImageField(Base64ImageField, HeaderCheckedImageField):
+    """Принимает картинку строкой base64 или файлом из multipart."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, UploadedFile):
+            return HeaderCheckedImageField.to_internal_value(self, data)
+        if isinstance(data, str):
+            # base64 длиннее исходных данных в 4/3 раза.
+            if len(data) * 3 // 4 > settings.RECIPE_IMAGE_MAX_SIZE:
+                raise serializers.ValidationError(
+                    get_file_too_large_message()
+                )
+        return super().to_internal_value(data)
+
+
 class IngredientSerializer(serializers.ModelSerializer):
     class Meta:
         model = Ingredient
@@ -54,9 +141,9 @@ class IngredientInRecipeSerializer(serializers.ModelSerializer):
 
 
 class AddIngredientSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all()
-    )
+    # Ингредиенты всего рецепта ищутся одним запросом
+    # в AddRecipeSerializer.validate.
+    id = serializers.IntegerField()
     amount = serializers.IntegerField()
 
     class Meta:
@@ -81,12 +168,24 @@ class CustomUserSerializer(UserSerializer):
             'is_subscribed'
         )
 
+    def get_subscriptions(self, user):
+        # Контекст общий для всех вложенных сериализаторов запроса,
+        # поэтому подписки загружаются одним запросом на всю страницу.
+        if 'subscriptions' not in self.context:
+            self.context['subscriptions'] = set(
+                Follow.objects.filter(user=user).values_list(
+                    'author_id', flat=True
+                )
+            )
+        return self.context['subscriptions']
+
     def get_is_subscribed(self, obj):
         request = self.context.get('request')
         if request is None or request.user.is_anonymous:
             return False
-        return Follow.objects.filter(
-            user=request.user, author=obj).exists()
+        if obj.id == request.user.id:
+            return False
+        return obj.id in self.get_subscriptions(request.user)
 
 
 class RecipeSerializer(serializers.ModelSerializer):
@@ -99,6 +198,7 @@ class RecipeSerializer(serializers.ModelSerializer):
         read_only=True, many=True
     )
     image = Base64ImageField()
+    image_srcset = ImageVariantsField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
@@ -110,6 +210,7 @@ class RecipeSerializer(serializers.ModelSerializer):
             'author',
             'name',
             'image',
+            'image_srcset',
             'text',
             'ingredients',
             'is_favorited',
@@ -117,26 +218,25 @@ class RecipeSerializer(serializers.ModelSerializer):
             'cooking_time'
         )
 
-    def in_list(self, obj, model):
+    def in_list(self, obj, model, annotation):
         request = self.context.get('request')
         if request is None or request.user.is_anonymous:
             return False
+        if hasattr(obj, annotation):
+            return getattr(obj, annotation)
         return model.objects.filter(user=request.user, recipe=obj).exists()
 
     def get_is_favorited(self, obj):
-        return self.in_list(obj, FavoriteRecipe)
+        return self.in_list(obj, FavoriteRecipe, 'is_favorited')
 
     def get_is_in_shopping_cart(self, obj):
-        return self.in_list(obj, ShoppingCart)
+        return self.in_list(obj, ShoppingCart, 'is_in_shopping_cart')
 
 
 class AddRecipeSerializer(serializers.ModelSerializer):
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(),
-        many=True
-    )
+    tags = serializers.ListField(child=serializers.IntegerField())
     ingredients = AddIngredientSerializer(many=True)
-    image = Base64ImageField(max_length=None)
+    image = RecipeImageField(max_length=None)
 
     class Meta:
         model = Recipe
@@ -150,12 +250,17 @@ class AddRecipeSerializer(serializers.ModelSerializer):
         )
 
     def to_representation(self, instance):
-        serializer = RecipeSerializer(instance)
+        # Ответ собирается из только что записанных объектов:
+        # вьюсет сбрасывает кеш prefetch после save(), поэтому он
+        # заполняется здесь.
+        for name, objects in getattr(self, 'written_relations', {}).items():
+            set_prefetched(instance, name, objects)
+        serializer = RecipeSerializer(instance, context=self.context)
         return serializer.data
 
     def create_bulk(self, recipe, ingredients_data):
-        IngredientWithAmount.objects.bulk_create([IngredientWithAmount(
-            ingredient=ingredient['id'],
+        return IngredientWithAmount.objects.bulk_create([IngredientWithAmount(
+            ingredient=ingredient['ingredient'],
             recipe=recipe,
             amount=ingredient['amount']
         ) for ingredient in ingredients_data])
@@ -165,59 +270,156 @@ class AddRecipeSerializer(serializers.ModelSerializer):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         recipe = Recipe.objects.create(**validated_data)
-        recipe.save()
         recipe.tags.set(tags)
-        self.create_bulk(recipe, ingredients)
+        rows = self.create_bulk(recipe, ingredients)
+        enqueue(generate_image_variants, recipe_id=recipe.id)
+        enqueue(fan_out_recipes, recipe_ids=[recipe.id])
+        enqueue(index_similarity, recipe_ids=[recipe.id])
+        recipe.is_favorited = recipe.is_in_shopping_cart = False
+        # Порядок как в Meta.ordering IngredientWithAmount: новые первыми.
+        self.written_relations = {
+            'tags': sorted(tags, key=lambda tag: tag.id),
+            'ingredient_in_recipe': rows[::-1],
+        }
         return recipe
 
+    def update_ingredients(self, recipe, ingredients_data):
+        """Приводит состав рецепта к ingredients_data, затрагивая только
+        изменившиеся строки. Возвращает прежние и новые количества."""
+        current = {
+            row.ingredient_id: row
+            for row in recipe.ingredient_in_recipe.all()
+        }
+        old_amounts = {pk: row.amount for pk, row in current.items()}
+        new_amounts = {
+            ingredient['ingredient'].id: ingredient['amount']
+            for ingredient in ingredients_data
+        }
+        removed = old_amounts.keys() - new_amounts.keys()
+        if removed:
+            IngredientWithAmount.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        added = [
+            IngredientWithAmount(
+                ingredient=ingredient['ingredient'],
+                recipe=recipe,
+                amount=ingredient['amount']
+            )
+            for ingredient in ingredients_data
+            if ingredient['ingredient'].id not in current
+        ]
+        if added:
+            IngredientWithAmount.objects.bulk_create(added)
+        changed = []
+        for pk, row in current.items():
+            if new_amounts.get(pk, row.amount) != row.amount:
+                row.amount = new_amounts[pk]
+                changed.append(row)
+        if changed:
+            IngredientWithAmount.objects.bulk_update(changed, ['amount'])
+        self.written_relations['ingredient_in_recipe'] = added[::-1] + [
+            row for pk, row in current.items() if pk not in removed
+        ]
+        return old_amounts, new_amounts
+
     @transaction.atomic
     def update(self, instance, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
-        instance.ingredients.clear()
-        self.create_bulk(instance, ingredients)
-        instance.tags.clear()
+        self.written_relations = {
+            'tags': sorted(tags, key=lambda tag: tag.id)
+        }
+        old_amounts, new_amounts = self.update_ingredients(
+            instance, ingredients
+        )
+        # Удалённые строки состава вычитаются из корзин сигналом
+        # post_delete, массовые вставка и обновление сигналов не шлют.
+        # Итоги пересчитываются в этой же транзакции: отложенная разница
+        # могла бы лечь после удаления рецепта из корзины.
+        kept_amounts = {
+            pk: amount for pk, amount in old_amounts.items()
+            if pk in new_amounts
+        }
+        ShoppingListItem.objects.change_recipe(
+            instance, kept_amounts, new_amounts
+        )
         instance.tags.set(tags)
-        return super().update(instance, validated_data)
+        if old_amounts.keys() != new_amounts.keys():
+            enqueue(index_similarity, recipe_ids=[instance.id])
+        old_image = instance.image.name
+        instance = super().update(instance, validated_data)
+        if instance.image.name != old_image:
+            enqueue(generate_image_variants, recipe_id=instance.id)
+        return instance
+
+    def get_objects(self, model, ids):
+        """Объекты по id: из заранее загруженного справочника в контексте
+        (пакетный импорт) или одним запросом."""
+        lookup = self.context.get(f'{model._meta.model_name}_lookup')
+        if lookup is None:
+            return model.objects.in_bulk(ids)
+        return {pk: lookup[pk] for pk in ids if pk in lookup}
+
+    def validate_tags(self, value):
+        tag_ids = list(dict.fromkeys(value))
+        found = self.get_objects(Tag, tag_ids)
+        missing = set(tag_ids) - found.keys()
+        if missing:
+            raise serializers.ValidationError(
+                f'Тэги не найдены: {sorted(missing)}'
+            )
+        return [found[pk] for pk in tag_ids]
 
     def validate(self, data):
-        cooking_time = self.initial_data.get('cooking_time')
+        cooking_time = data.get('cooking_time')
         if int(cooking_time) <= 0:
             raise serializers.ValidationError(
                 'Время приготовления должно быть больше 0'
             )
-        ingredients = self.initial_data.get('ingredients')
+        ingredients = data.get('ingredients')
         if not ingredients:
             raise serializers.ValidationError(
                 'Поле с ингредиентами не может быть пустым'
             )
-        unique_ingredients = []
+        unique_ingredients = set()
         for ingredient in ingredients:
             id_ingredient = ingredient['id']
-            if int(ingredient['amount']) <= 0:
+            if ingredient['amount'] <= 0:
                 raise serializers.ValidationError(
                     f'Не корректное количество для {id_ingredient}'
                 )
-            if not isinstance(int(ingredient['amount']), int):
-                raise serializers.ValidationError(
-                    'Количество ингредиентов должно быть целым числом'
-                )
-            if id_ingredient not in unique_ingredients:
-                unique_ingredients.append(id_ingredient)
-            else:
+            if id_ingredient in unique_ingredients:
                 raise serializers.ValidationError(
                     'В рецепте не может быть повторяющихся ингредиентов'
                 )
+            unique_ingredients.add(id_ingredient)
+        found = self.get_objects(Ingredient, unique_ingredients)
+        missing = unique_ingredients - found.keys()
+        if missing:
+            raise serializers.ValidationError(
+                f'Ингредиенты не найдены: {sorted(missing)}'
+            )
+        data['ingredients'] = [
+            {
+                'ingredient': found[ingredient['id']],
+                'amount': ingredient['amount']
+            }
+            for ingredient in ingredients
+        ]
         return data
 
 
 class RecipeShortSerializer(serializers.ModelSerializer):
+    image_srcset = ImageVariantsField()
+
     class Meta:
         model = Recipe
         fields = (
             'id',
             'name',
             'image',
+            'image_srcset',
             'cooking_time'
         )
 
@@ -292,13 +494,13 @@ class FollowSerializer(serializers.ModelSerializer):
 
     def get_is_subscribed(self, obj):
         request = self.context.get('request')
-        return Follow.objects.filter(
-            author=obj.author, user=request.user
-        ).exists()
+        return obj.user_id == request.user.id
 
     def get_recipes(self, obj):
         request = self.context.get('request')
-        if request.GET.get('recipes_limit'):
+        if hasattr(obj.author, 'recipes_preview'):
+            queryset = obj.author.recipes_preview
+        elif request.GET.get('recipes_limit'):
             recipes_limit = int(request.GET.get('recipes_limit'))
             queryset = Recipe.objects.filter(
                 author=obj.author)[:recipes_limit]
@@ -311,4 +513,17 @@ class FollowSerializer(serializers.ModelSerializer):
         return serializer.data
 
     def get_recipes_count(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return obj.author.recipes.all().count()
+
+
+class JobSerializer(serializers.ModelSerializer):
+    result = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = ('id', 'status', 'attempts', 'result', 'created', 'updated')
+
+    def get_result(self, obj):
+        return obj.get_result()
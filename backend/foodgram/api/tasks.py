@@ -0,0 +1,18 @@
+import uuid
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from jobs.registry import job
+from .utils import FILE_NAME, get_shopping_list, render_shopping_list
+
+
+@job('api.render_shopping_list')
+def render_shopping_list_file(user_id, file_format):
+    name = default_storage.save(
+        f'{FILE_NAME}s/{uuid.uuid4().hex}.{file_format}',
+        ContentFile(render_shopping_list(
+            get_shopping_list(user_id), file_format
+        ))
+    )
+    return {'url': default_storage.url(name)}
@@ -1,7 +1,7 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import (FavoriteView, IngredientViewSet, RecipeViewSet,
+from .views import (FavoriteView, IngredientViewSet, JobView, RecipeViewSet,
                     TagViewSet)
 
 app_name = 'api'
@@ -16,5 +16,6 @@ router.register('recipes', RecipeViewSet, basename='recipe')
 urlpatterns = [
     path('', include(router.urls)),
     path('recipes/<int:favorite_id>/favorite/', FavoriteView.as_view()),
+    path('jobs/<int:pk>/', JobView.as_view()),
 
 ]
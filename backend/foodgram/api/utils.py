@@ -1,16 +1,117 @@
-from django.http import HttpResponse
+import csv
+import io
+from functools import lru_cache
+
+from django.conf import settings
+from django.db.models import F
+from django.http import StreamingHttpResponse
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from recipes.models import ShoppingListItem
+
+FILE_NAME = 'shopping_list'
+CSV_HEADER = ('Ингредиент', 'Единица измерения', 'Количество')
+PDF_FONT_NAME = 'ShoppingListFont'
+PDF_FONT_SIZE = 12
+PDF_MARGIN = 50
+PDF_LINE_HEIGHT = 18
+PDF_CHUNK_SIZE = 64 * 1024
+
+
+def get_shopping_list(user_id):
+    return ShoppingListItem.objects.filter(
+        user_id=user_id
+    ).values(
+        'ingredient__name', 'ingredient__measurement_unit',
+        ingredient_total=F('amount')
+    ).order_by(
+        'ingredient__name'
+    )
+
+
+class Echo:
+    """Псевдобуфер: csv.writer пишет строку и сразу получает её обратно."""
+
+    def write(self, value):
+        return value
+
+
+def shopping_list_rows(shop_list):
+    for ing in shop_list.iterator():
+        yield (
+            ing['ingredient__name'],
+            ing['ingredient__measurement_unit'],
+            ing['ingredient_total'],
+        )
 
 
 def convert_txt(shop_list):
-    file_name = 'shopping_list.txt'
-    lines = []
-    for ing in shop_list:
-        name = ing['ingredient__name']
-        measurement_unit = ing['ingredient__measurement_unit']
-        amount = ing['ingredient_total']
-        lines.append(f'{name} ({measurement_unit}) - {amount}')
-    content = '\n'.join(lines)
-    content_type = 'text/plain,charset=utf8'
-    response = HttpResponse(content, content_type=content_type)
-    response['Content-Disposition'] = f'attachment; filename={file_name}'
+    for name, measurement_unit, amount in shopping_list_rows(shop_list):
+        yield f'{name} ({measurement_unit}) - {amount}\n'
+
+
+def convert_csv(shop_list):
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    for row in shopping_list_rows(shop_list):
+        yield writer.writerow(row)
+
+
+@lru_cache()
+def get_pdf_font():
+    """Регистрирует шрифт с кириллицей один раз на процесс."""
+    pdfmetrics.registerFont(
+        TTFont(PDF_FONT_NAME, settings.SHOPPING_LIST_PDF_FONT)
+    )
+    return PDF_FONT_NAME
+
+
+def convert_pdf(shop_list):
+    font = get_pdf_font()
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+    top = height - PDF_MARGIN
+    y = top
+    pdf.setFont(font, PDF_FONT_SIZE)
+    for name, measurement_unit, amount in shopping_list_rows(shop_list):
+        if y < PDF_MARGIN:
+            pdf.showPage()
+            pdf.setFont(font, PDF_FONT_SIZE)
+            y = top
+        pdf.drawString(
+            PDF_MARGIN, y, f'{name} ({measurement_unit}) - {amount}'
+        )
+        y -= PDF_LINE_HEIGHT
+    pdf.save()
+    buffer.seek(0)
+    yield from iter(lambda: buffer.read(PDF_CHUNK_SIZE), b'')
+
+
+CONVERTERS = {
+    'txt': (convert_txt, 'text/plain; charset=utf-8'),
+    'csv': (convert_csv, 'text/csv; charset=utf-8'),
+    'pdf': (convert_pdf, 'application/pdf'),
+}
+
+
+def render_shopping_list(shop_list, file_format):
+    converter = CONVERTERS[file_format][0]
+    return b''.join(
+        chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+        for chunk in converter(shop_list)
+    )
+
+
+def stream_shopping_list(shop_list, file_format):
+    converter, content_type = CONVERTERS[file_format]
+    response = StreamingHttpResponse(
+        converter(shop_list), content_type=content_type
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename={FILE_NAME}.{file_format}'
+    )
     return response
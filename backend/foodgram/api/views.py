@@ -1,22 +1,42 @@
-from django.db.models import Sum
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import (BooleanField, Count, Exists, F, OuterRef,
+                              Prefetch, Window)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import generics, permissions, status, views, viewsets
 from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.validators import ValidationError
 
-from recipes.models import (FavoriteRecipe, Ingredient, IngredientWithAmount,
-                            Recipe, ShoppingCart, Tag)
+from jobs.registry import enqueue
+from recipes.feed import get_sources
+from recipes.models import (FavoriteRecipe, FeedEntry, Ingredient,
+                            IngredientWithAmount, Recipe, ShoppingCart, Tag)
+from recipes.similarity import get_similar_recipe_ids
+from recipes.tasks import backfill_feed
 from users.models import CustomUser, Follow
 from .filters import IngredientFilter, TagFilter
-from .pagination import CustomPageNumberPagination
+from .importers import import_recipes
+from .pantry import pantry_index
+from .pagination import (CustomPageNumberPagination, FeedPagination,
+                         OptionalKeysetPagination, RecipePagination)
+from .parsers import LimitedMultiPartParser, NDJSONParser
+from .renderers import CSVRenderer, PDFRenderer, TXTRenderer
+from .search import ingredient_index
 from .serializers import (AddRecipeSerializer, FavoriteSerializer,
                           FollowSerializer, IngredientSerializer,
-                          RecipeSerializer, RecipeShortSerializer,
-                          SubscribeSerializer, TagSerializer)
-from .utils import convert_txt
+                          JobSerializer, RecipeSerializer,
+                          RecipeShortSerializer, SubscribeSerializer,
+                          TagSerializer)
+from .tasks import render_shopping_list_file
+from .utils import get_shopping_list, stream_shopping_list
 
 
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
@@ -24,6 +44,7 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = TagSerializer
     search_fields = ('^name',)
     permission_classes = (AllowAny,)
+    pagination_class = None
 
 
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
@@ -31,18 +52,70 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = IngredientSerializer
     search_fields = ('^name',)
     permission_classes = (AllowAny,)
+    pagination_class = None
     filter_backends = (DjangoFilterBackend,)
-    filter_class = IngredientFilter
+    filterset_class = IngredientFilter
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name:
+            return Response(ingredient_index.search(name))
+        return super().list(request, *args, **kwargs)
 
 
 class SubscriptionViewSet(generics.ListAPIView):
     serializer_class = FollowSerializer
-    pagination_class = CustomPageNumberPagination
+    pagination_class = OptionalKeysetPagination
     permission_classes = (IsAuthenticated, )
 
+    def get_recipes_limit(self):
+        recipes_limit = self.request.query_params.get('recipes_limit')
+        if not recipes_limit:
+            return None
+        try:
+            recipes_limit = int(recipes_limit)
+        except ValueError:
+            recipes_limit = 0
+        if recipes_limit <= 0:
+            raise ValidationError(
+                {'recipes_limit': 'Ожидается целое положительное число'}
+            )
+        return recipes_limit
+
+    def get_recipes_preview(self, user):
+        recipes = Recipe.objects.filter(author__following__user=user)
+        recipes_limit = self.get_recipes_limit()
+        if recipes_limit is None:
+            return recipes
+        ranked = recipes.annotate(row_number=Window(
+            expression=RowNumber(),
+            partition_by=F('author'),
+            order_by=F('pub_date').desc(),
+        )).values('id', 'row_number')
+        sql, params = ranked.query.sql_with_params()
+        quote_name = connection.ops.quote_name
+        column = '{}.{}'.format(
+            quote_name(Recipe._meta.db_table),
+            quote_name(Recipe._meta.pk.column)
+        )
+        # Django не умеет фильтровать по оконной функции,
+        # поэтому ранжированная выборка оборачивается во внешний запрос.
+        return Recipe.objects.annotate(in_preview=RawSQL(
+            f'{column} IN '
+            f'(SELECT id FROM ({sql}) ranked WHERE row_number <= %s)',
+            (*params, recipes_limit),
+            output_field=BooleanField()
+        )).filter(in_preview=True)
+
     def get_queryset(self):
         user = self.request.user
-        return user.follower.all()
+        return user.follower.select_related('author').annotate(
+            recipes_count=Count('author__recipes')
+        ).prefetch_related(Prefetch(
+            'author__recipes',
+            queryset=self.get_recipes_preview(user),
+            to_attr='recipes_preview'
+        ))
 
 
 class SubscribeView(views.APIView):
@@ -61,7 +134,9 @@ class SubscribeView(views.APIView):
             context={'request': request}
         )
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        with transaction.atomic():
+            serializer.save()
+            enqueue(backfill_feed, user_id=user.id, author_id=author.id)
         return Response(data=serializer.data, status=status.HTTP_201_CREATED)
 
     def delete(self, request, pk):
@@ -72,17 +147,42 @@ class SubscribeView(views.APIView):
             user=user,
             author=author
         )
-        subscription.delete()
+        with transaction.atomic():
+            subscription.delete()
+            FeedEntry.objects.filter(user=user, author=author).delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 class RecipeViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
-    pagination_class = CustomPageNumberPagination
+    pagination_class = RecipePagination
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
+    parser_classes = (JSONParser, LimitedMultiPartParser)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = TagFilter
 
+    def get_queryset(self):
+        queryset = Recipe.objects.select_related('author').prefetch_related(
+            Prefetch('tags', queryset=Tag.objects.all()),
+            Prefetch(
+                'ingredient_in_recipe',
+                queryset=IngredientWithAmount.objects.select_related(
+                    'ingredient'
+                )
+            ),
+        )
+        user = self.request.user
+        if user.is_authenticated:
+            queryset = queryset.annotate(
+                is_favorited=Exists(FavoriteRecipe.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )),
+                is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )),
+            )
+        return queryset
+
     def get_serializer_class(self):
         if self.action in ('list', 'retrieve'):
             return RecipeSerializer
@@ -91,6 +191,117 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    @action(detail=False, permission_classes=(AllowAny,))
+    def pantry(self, request):
+        try:
+            ingredient_ids = [
+                int(pk) for pk in request.query_params.getlist('ingredients')
+            ]
+        except ValueError:
+            raise ValidationError('Ожидаются id ингредиентов')
+        if not 0 < len(ingredient_ids) <= settings.PANTRY_MAX_INGREDIENTS:
+            raise ValidationError(
+                'Укажите от 1 до {} ингредиентов'.format(
+                    settings.PANTRY_MAX_INGREDIENTS
+                )
+            )
+        filterset = TagFilter(
+            request.query_params, queryset=Recipe.objects.none(),
+            request=request
+        )
+        if not filterset.is_valid():
+            raise ValidationError(filterset.errors)
+        author = filterset.form.cleaned_data.get('author')
+        matches = pantry_index.match(
+            ingredient_ids,
+            tag_ids=[tag.id for tag in filterset.form.cleaned_data['tags']],
+            author_id=author.id if author else None
+        )
+        paginator = CustomPageNumberPagination()
+        page = paginator.paginate_queryset(matches, request, view=self)
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _, _ in page]
+        )
+        page = [item for item in page if item[0] in recipes]
+        data = RecipeSerializer(
+            [recipes[recipe_id] for recipe_id, _, _ in page],
+            many=True, context=self.get_serializer_context()
+        ).data
+        for item, (_, found, total) in zip(data, page):
+            item['coverage'] = round(found / total, 3)
+            item['missing'] = total - found
+        return paginator.get_paginated_response(data)
+
+    @action(detail=True, permission_classes=(AllowAny,))
+    def similar(self, request, pk):
+        recipe = get_object_or_404(Recipe, pk=pk)
+        try:
+            limit = int(request.query_params.get('limit', 0))
+        except ValueError:
+            limit = 0
+        if not 0 < limit <= settings.SIMILAR_RECIPES_LIMIT:
+            limit = settings.SIMILAR_RECIPES_LIMIT
+        recipe_ids = get_similar_recipe_ids(recipe.id, limit)
+        recipes = self.get_queryset().in_bulk(recipe_ids)
+        data = RecipeSerializer(
+            [recipes[pk] for pk in recipe_ids if pk in recipes],
+            many=True, context=self.get_serializer_context()
+        ).data
+        return Response(data)
+
+    @action(detail=False, permission_classes=(IsAuthenticated,))
+    def feed(self, request):
+        paginator = FeedPagination()
+        page = paginator.paginate_sources(get_sources(request.user), request)
+        recipes = self.get_queryset().in_bulk(
+            [position.recipe_id for position in page]
+        )
+        data = RecipeSerializer(
+            [recipes[position.recipe_id] for position in page
+             if position.recipe_id in recipes],
+            many=True, context=self.get_serializer_context()
+        ).data
+        return paginator.get_paginated_response(data)
+
+    @action(detail=False, permission_classes=(AllowAny,))
+    def trending(self, request):
+        try:
+            limit = int(request.query_params.get('limit', 0))
+        except ValueError:
+            limit = 0
+        if not 0 < limit <= settings.TRENDING_LIMIT:
+            limit = settings.TRENDING_LIMIT
+        # Анонимный ответ одинаков для всех, его можно отдавать из кэша.
+        cache_key = f'recipes:trending:{limit}'
+        if not request.user.is_authenticated:
+            data = cache.get(cache_key)
+            if data is not None:
+                return Response(data)
+        recipes = self.get_queryset().filter(
+            trending__isnull=False
+        ).order_by('trending__rank')[:limit]
+        data = RecipeSerializer(
+            recipes, many=True, context=self.get_serializer_context()
+        ).data
+        if not request.user.is_authenticated:
+            cache.set(cache_key, data, settings.TRENDING_CACHE_TTL)
+        return Response(data)
+
+    @action(
+        methods=['post'], detail=False, url_path='import',
+        permission_classes=(permissions.IsAdminUser,),
+        parser_classes=(JSONParser, NDJSONParser)
+    )
+    def import_recipes(self, request):
+        if not isinstance(request.data, list):
+            raise ValidationError('Ожидается массив рецептов')
+        results = list(import_recipes(request.data, request.user))
+        created = sum('id' in result for result in results)
+        return Response(
+            {'created': created, 'results': results},
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
+
     @action(
         methods=['post', 'delete'], detail=True,
         permission_classes=(permissions.IsAuthenticated,)
@@ -103,18 +314,24 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     @action(
         detail=False,
-        permission_classes=(IsAuthenticated,)
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=(TXTRenderer, CSVRenderer, PDFRenderer)
     )
     def download_shopping_cart(self, request):
-        ingredients = IngredientWithAmount.objects.filter(
-            recipe__shopping_cart__user=request.user
-        ).values(
-            'ingredient__name', 'ingredient__measurement_unit'
-        ).order_by(
-            'ingredient__name'
-        ).annotate(ingredient_total=Sum('amount'))
-        return convert_txt(ingredients)
+        file_format = request.accepted_renderer.format
+        if request.query_params.get('background') in ('1', 'true'):
+            job = enqueue(
+                render_shopping_list_file, user=request.user,
+                user_id=request.user.id, file_format=file_format
+            )
+            return JsonResponse(
+                JobSerializer(job).data, status=status.HTTP_202_ACCEPTED
+            )
+        return stream_shopping_list(
+            get_shopping_list(request.user.id), file_format
+        )
 
+    @transaction.atomic
     def add_recipe(self, model, request, pk):
         recipe = get_object_or_404(Recipe, pk=pk)
         user = self.request.user
@@ -124,6 +341,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
         serializer = RecipeShortSerializer(recipe)
         return Response(data=serializer.data, status=status.HTTP_201_CREATED)
 
+    @transaction.atomic
     def delete_recipe(self, model, request, pk):
         recipe = get_object_or_404(Recipe, pk=pk)
         user = self.request.user
@@ -135,6 +353,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
 class FavoriteView(views.APIView):
     permission_classes = (IsAuthenticated, )
 
+    @transaction.atomic
     def post(self, request, favorite_id):
         user = request.user
         data = {
@@ -147,10 +366,24 @@ class FavoriteView(views.APIView):
         )
         serializer.is_valid(raise_exception=True)
         serializer.save()
+        FavoriteRecipe.objects.change_count(favorite_id, 1)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @transaction.atomic
     def delete(self, request, favorite_id):
         user = request.user
         recipe = get_object_or_404(Recipe, id=favorite_id)
-        FavoriteRecipe.objects.filter(user=user, recipe=recipe).delete()
+        deleted, _ = FavoriteRecipe.objects.filter(
+            user=user, recipe=recipe
+        ).delete()
+        if deleted:
+            FavoriteRecipe.objects.change_count(recipe.id, -deleted)
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class JobView(generics.RetrieveAPIView):
+    serializer_class = JobSerializer
+    permission_classes = (IsAuthenticated, )
+
+    def get_queryset(self):
+        return self.request.user.jobs.all()
@@ -26,10 +26,12 @@ INSTALLED_APPS = [
     'api.apps.ApiConfig',
     'recipes.apps.RecipesConfig',
     'users.apps.UsersConfig',
+    'jobs.apps.JobsConfig',
     'django_filters',
 ]
 
 MIDDLEWARE = [
+    'api.middleware.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -121,8 +123,88 @@ REST_FRAMEWORK = {
     'DEFAULT_FILTER_BACKENDS': (
         'django_filters.rest_framework.DjangoFilterBackend',
     ),
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.CustomPageNumberPagination',
 }
 
+ADMIN_ESTIMATED_COUNT_THRESHOLD = 100000
+
+SLOW_REQUEST_THRESHOLD = int(os.getenv('SLOW_REQUEST_THRESHOLD', default=500))
+
+REQUEST_TIMING_SLOWEST = 3
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'api.middleware': {
+            'handlers': ['console'],
+            'level': os.getenv('REQUEST_LOG_LEVEL', default='INFO'),
+            'propagate': False,
+        },
+    },
+}
+
+INGREDIENT_SEARCH_LIMIT = 50
+
+INGREDIENT_INDEX_TTL = 300
+
+RECIPE_SEARCH_LIMIT = 1000
+
+RECIPE_IMAGE_MAX_SIZE = 10 * 1024 * 1024
+
+RECIPE_IMAGE_MAX_DIMENSION = 6000
+
+TRENDING_WINDOW = 7 * 24 * 60 * 60
+
+TRENDING_HALF_LIFE = 24 * 60 * 60
+
+TRENDING_FAVORITE_WEIGHT = 2.0
+
+TRENDING_CART_WEIGHT = 1.0
+
+TRENDING_LIMIT = 100
+
+TRENDING_CACHE_TTL = 60
+
+FEED_FANOUT_LIMIT = 5000
+
+FEED_BACKFILL_LIMIT = 200
+
+PANTRY_INDEX_TTL = 60
+
+PANTRY_MAX_INGREDIENTS = 100
+
+SIMILAR_RECIPES_PERMUTATIONS = 64
+
+# 16 полос по 4 строки: кандидатами становятся рецепты со сходством
+# примерно от 0,5, остальные отсекаются уже на уровне корзин.
+SIMILAR_RECIPES_BANDS = 16
+
+SIMILAR_RECIPES_CANDIDATES = 500
+
+SIMILAR_RECIPES_LIMIT = 12
+
+JOBS_EAGER = False
+
+JOBS_RETRY_DELAY = 10
+
+JOBS_TIMEOUT = 600
+
+JOBS_PERIODIC = {
+    'recipes.update_trending': 5 * 60,
+    'recipes.update_feed_pull_authors': 5 * 60,
+}
+
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
 DJOSER = {
     "LOGIN_FIELD": 'email',
     'USER_ID_FIELD': 'id',
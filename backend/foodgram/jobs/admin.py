@@ -0,0 +1,23 @@
+from django.contrib import admin
+
+from foodgram.paginators import LargeTableAdminMixin
+from .models import Job
+
+
+class JobAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = (
+        'id',
+        'name',
+        'status',
+        'attempts',
+        'user',
+        'created',
+        'updated'
+    )
+    list_filter = ('status',)
+    search_fields = ('name',)
+    raw_id_fields = ('user',)
+    list_select_related = ('user',)
+
+
+admin.site.register(Job, JobAdmin)
@@ -0,0 +1,61 @@
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import django
+from django.core.management.base import BaseCommand
+
+from jobs.registry import claim_jobs, run_job, schedule_periodic_jobs
+
+
+class Command(BaseCommand):
+    help = 'Запускает воркер фоновых задач с пулом процессов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=2,
+            help='Число процессов в пуле'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help='Пауза между опросами очереди, секунд'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить готовые задачи и завершиться'
+        )
+
+    def handle(self, *args, **options):
+        processes = options['processes']
+        running = set()
+        # spawn, а не fork: дочерние процессы не наследуют соединения с БД.
+        pool = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=django.setup
+        )
+        with pool:
+            while True:
+                schedule_periodic_jobs()
+                for job_id in claim_jobs(processes - len(running)):
+                    running.add(pool.submit(run_job, job_id))
+                if running:
+                    done, running = wait(
+                        running,
+                        timeout=options['poll_interval'],
+                        return_when=FIRST_COMPLETED
+                    )
+                    for future in done:
+                        self.report(future)
+                elif options['once']:
+                    break
+                else:
+                    time.sleep(options['poll_interval'])
+
+    def report(self, future):
+        try:
+            status = future.result()
+        except Exception as error:
+            self.stderr.write(f'Процесс задачи упал: {error}')
+            return
+        self.stdout.write(f'Задача завершена: {status}')
@@ -0,0 +1,138 @@
+import json
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+def job(name, max_attempts=3):
+    """Регистрирует функцию как фоновую задачу с именем name."""
+    def decorator(func):
+        func.job_name = name
+        func.max_attempts = max_attempts
+        registry[name] = func
+        return func
+    return decorator
+
+
+def enqueue(func, user=None, **arguments):
+    """Ставит задачу в очередь. Аргументы должны сериализоваться в JSON.
+
+    Задача видна воркеру только после фиксации текущей транзакции.
+    С JOBS_EAGER задача выполняется в этом же процессе после фиксации.
+    """
+    new_job = Job.objects.create(
+        name=func.job_name,
+        arguments=json.dumps(arguments),
+        max_attempts=func.max_attempts,
+        user=user,
+    )
+    if settings.JOBS_EAGER:
+        transaction.on_commit(lambda: run_job(new_job.id))
+    return new_job
+
+
+def schedule_periodic_jobs():
+    """Ставит в очередь задачи из JOBS_PERIODIC ({имя: интервал, секунд}),
+    если следующий запуск ещё не запланирован."""
+    now = timezone.now()
+    for name, interval in settings.JOBS_PERIODIC.items():
+        jobs = Job.objects.filter(name=name)
+        if jobs.filter(status__in=(Job.PENDING, Job.RUNNING)).exists():
+            continue
+        last = jobs.order_by('-id').values_list('created', flat=True).first()
+        run_after = now
+        if last is not None:
+            run_after = max(now, last + timedelta(seconds=interval))
+        Job.objects.create(
+            name=name,
+            max_attempts=registry[name].max_attempts,
+            run_after=run_after,
+        )
+
+
+def claim_jobs(limit):
+    """Забирает до limit готовых к запуску задач.
+
+    Условный UPDATE по статусу гарантирует, что одну задачу не заберут
+    два воркера, и работает без блокировок строк (в том числе в SQLite).
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.JOBS_TIMEOUT)
+    Job.objects.filter(status=Job.RUNNING, updated__lt=stale).update(
+        status=Job.PENDING, updated=now
+    )
+    candidates = Job.objects.filter(
+        status=Job.PENDING, run_after__lte=now
+    ).order_by('run_after', 'id').values_list('id', 'attempts')[:limit]
+    claimed = []
+    for pk, attempts in candidates:
+        if Job.objects.filter(pk=pk, status=Job.PENDING).update(
+            status=Job.RUNNING, attempts=attempts + 1, updated=now
+        ):
+            claimed.append(pk)
+    return claimed
+
+
+class JobLost(Exception):
+    """Задачу, пока она выполнялась, забрал другой воркер."""
+
+
+def save_claimed(claimed, current):
+    """Сохраняет итог задачи, только если её никто не перезабрал:
+    claim_jobs увеличивает attempts при каждом захвате."""
+    return claimed.update(
+        status=current.status,
+        attempts=current.attempts,
+        run_after=current.run_after,
+        result=current.result,
+        error=current.error,
+        updated=timezone.now(),
+    )
+
+
+def run_job(job_id):
+    """Выполняет задачу. Изменения, сделанные задачей, и статус DONE
+    фиксируются одной транзакцией: упавшая на полпути или перезабранная
+    по JOBS_TIMEOUT задача не применяет свои изменения дважды."""
+    close_old_connections()
+    current = Job.objects.get(pk=job_id)
+    claimed = Job.objects.filter(
+        pk=job_id, status=current.status, attempts=current.attempts
+    )
+    if current.status == Job.PENDING:
+        current.attempts += 1
+    try:
+        func = registry[current.name]
+        with transaction.atomic():
+            result = func(**current.get_arguments())
+            current.status = Job.DONE
+            current.result = json.dumps(result)
+            current.error = ''
+            if not save_claimed(claimed, current):
+                raise JobLost
+    except JobLost:
+        logger.warning(
+            'Задачу %s #%s перезабрал другой воркер', current.name, current.id
+        )
+        return Job.RUNNING
+    except Exception:
+        current.error = traceback.format_exc()
+        logger.exception('Задача %s упала', current)
+        if current.attempts < current.max_attempts:
+            current.status = Job.PENDING
+            delay = settings.JOBS_RETRY_DELAY * 2 ** (current.attempts - 1)
+            current.run_after = timezone.now() + timedelta(seconds=delay)
+        else:
+            current.status = Job.FAILED
+        save_claimed(claimed, current)
+    return current.status
@@ -1,15 +1,22 @@
 from django.contrib import admin
 
+from foodgram.paginators import LargeTableAdminMixin
 from .models import (FavoriteRecipe, Ingredient, IngredientWithAmount, Recipe,
-                     ShoppingCart, Tag)
+                     ShoppingCart, Tag, TrendingRecipe)
 
 
 class IngredientsInRecipeInline(admin.TabularInline):
     model = Recipe.ingredients.through
     extra = 1
+    autocomplete_fields = ('ingredient',)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'recipe', 'ingredient'
+        )
 
-class IngredientsInRecipeAdmin(admin.ModelAdmin):
+
+class IngredientsInRecipeAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = (
         'pk',
         'ingredient',
@@ -17,9 +24,11 @@ class IngredientsInRecipeAdmin(admin.ModelAdmin):
         'amount'
     )
     search_fields = ('recipe__name', 'ingredient__name')
+    list_select_related = ('ingredient', 'recipe')
+    autocomplete_fields = ('ingredient', 'recipe')
 
 
-class FavoriteAdmin(admin.ModelAdmin):
+class FavoriteAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = (
         'id',
         'user',
@@ -30,6 +39,8 @@ class FavoriteAdmin(admin.ModelAdmin):
         'user__email',
         'recipe__name'
     )
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
 
 
 class IngredientsAdmin(admin.ModelAdmin):
@@ -39,11 +50,11 @@ class IngredientsAdmin(admin.ModelAdmin):
         'measurement_unit'
     )
     search_fields = ('name',)
-    list_filter = ('name',)
+    list_filter = ('measurement_unit',)
     empty_value_display = '-пусто-'
 
 
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     inlines = (IngredientsInRecipeInline,)
     list_display = (
         'id',
@@ -51,20 +62,20 @@ class RecipeAdmin(admin.ModelAdmin):
         'name',
         'image',
         'text',
+        'favorites_count',
     )
     search_fields = (
         'name',
         'author__username',
         'author__email'
     )
-    list_filter = ('name', 'author', 'tags')
-    readonly_fields = ('is_favorited',)
-
-    def is_favorited(self, instance):
-        return instance.favorite_recipes.count()
+    list_filter = ('tags',)
+    list_select_related = ('author',)
+    autocomplete_fields = ('author',)
+    readonly_fields = ('favorites_count',)
 
 
-class ShoppingCartAdmin(admin.ModelAdmin):
+class ShoppingCartAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = (
         'id',
         'user',
@@ -75,6 +86,17 @@ class ShoppingCartAdmin(admin.ModelAdmin):
         'user__email',
         'recipe__name'
     )
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
+
+
+class TrendingRecipeAdmin(admin.ModelAdmin):
+    list_display = (
+        'rank',
+        'recipe',
+        'score'
+    )
+    list_select_related = ('recipe',)
 
 
 class TagAdmin(admin.ModelAdmin):
@@ -95,3 +117,4 @@ admin.site.register(IngredientWithAmount, IngredientsInRecipeAdmin)
 admin.site.register(Recipe, RecipeAdmin)
 admin.site.register(ShoppingCart, ShoppingCartAdmin)
 admin.site.register(Tag, TagAdmin)
+admin.site.register(TrendingRecipe, TrendingRecipeAdmin)
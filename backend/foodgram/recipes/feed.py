@@ -0,0 +1,122 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F
+
+from users.models import Follow
+from .models import FeedEntry, FeedPullAuthor, Recipe
+
+
+def get_pull_author_ids():
+    """Авторы с fan-out on read: их рецепты не раскладываются по лентам
+    при публикации, а читаются напрямую из рецептов при запросе ленты."""
+    return set(FeedPullAuthor.objects.values_list('author_id', flat=True))
+
+
+def update_pull_authors():
+    """Пересчитывает авторов, у которых подписчиков больше
+    FEED_FANOUT_LIMIT. Тем, кто выбыл из списка, последние рецепты
+    раскладываются по лентам подписчиков.
+
+    Возвращает число добавленных и выбывших авторов.
+    """
+    author_ids = set(Follow.objects.order_by().values('author').annotate(
+        followers=Count('id')
+    ).filter(
+        followers__gt=settings.FEED_FANOUT_LIMIT
+    ).values_list('author', flat=True))
+    current = get_pull_author_ids()
+    added = author_ids - current
+    removed = current - author_ids
+    with transaction.atomic():
+        FeedPullAuthor.objects.filter(author_id__in=removed).delete()
+        FeedPullAuthor.objects.bulk_create(
+            FeedPullAuthor(author_id=author_id) for author_id in added
+        )
+        for author_id in removed:
+            backfill_followers(author_id)
+    return len(added), len(removed)
+
+
+def make_entry(user_id, recipe):
+    recipe_id, author_id, pub_date = recipe
+    return FeedEntry(
+        user_id=user_id,
+        recipe_id=recipe_id,
+        author_id=author_id,
+        pub_date=pub_date
+    )
+
+
+def fan_out(recipe_ids):
+    """Добавляет рецепты в ленты подписчиков их авторов."""
+    pull_author_ids = get_pull_author_ids()
+    recipes = Recipe.objects.filter(pk__in=recipe_ids).exclude(
+        author__in=pull_author_ids
+    ).values_list('id', 'author_id', 'pub_date')
+    created = 0
+    for recipe in recipes:
+        follower_ids = Follow.objects.filter(
+            author_id=recipe[1]
+        ).values_list('user_id', flat=True).iterator()
+        entries = [make_entry(user_id, recipe) for user_id in follower_ids]
+        FeedEntry.objects.bulk_create(entries, ignore_conflicts=True)
+        created += len(entries)
+    return created
+
+
+def get_backfill_recipes(author_id):
+    return list(Recipe.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id'
+    ).values_list('id', 'author_id', 'pub_date')[
+        :settings.FEED_BACKFILL_LIMIT
+    ])
+
+
+def backfill(user_id, author_id):
+    """Кладёт в ленту последние FEED_BACKFILL_LIMIT рецептов автора."""
+    if FeedPullAuthor.objects.filter(author_id=author_id).exists():
+        return 0
+    entries = [
+        make_entry(user_id, recipe)
+        for recipe in get_backfill_recipes(author_id)
+    ]
+    FeedEntry.objects.bulk_create(entries, ignore_conflicts=True)
+    return len(entries)
+
+
+def backfill_followers(author_id):
+    """Кладёт последние рецепты автора в ленты всех его подписчиков."""
+    recipes = get_backfill_recipes(author_id)
+    created = 0
+    for user_id in Follow.objects.filter(author_id=author_id).values_list(
+        'user_id', flat=True
+    ).iterator():
+        entries = [make_entry(user_id, recipe) for recipe in recipes]
+        FeedEntry.objects.bulk_create(entries, ignore_conflicts=True)
+        created += len(entries)
+    return created
+
+
+def rebuild(user_id):
+    """Собирает ленту пользователя заново по его подпискам."""
+    FeedEntry.objects.filter(user_id=user_id).delete()
+    author_ids = Follow.objects.filter(user_id=user_id).values_list(
+        'author_id', flat=True
+    )
+    return sum(backfill(user_id, author_id) for author_id in author_ids)
+
+
+def get_sources(user):
+    """Источники ленты: записи ленты и рецепты авторов с fan-out on read.
+
+    Каждый источник отдаёт поля pub_date и recipe_id.
+    """
+    sources = [FeedEntry.objects.filter(user=user)]
+    pull_author_ids = list(Follow.objects.filter(
+        user=user, author__feed_pull__isnull=False
+    ).values_list('author_id', flat=True))
+    if pull_author_ids:
+        sources.append(Recipe.objects.filter(
+            author_id__in=pull_author_ids
+        ).annotate(recipe_id=F('id')))
+    return sources
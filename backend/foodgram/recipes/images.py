@@ -0,0 +1,88 @@
+import io
+import os
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+VARIANTS_DIR = 'variants'
+
+# Ширина варианта: карточка в ленте, страница рецепта, ретина-экраны.
+VARIANT_WIDTHS = {
+    'card': 400,
+    'detail': 800,
+    'retina': 1600,
+}
+
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def variant_name(image_name, variant, extension):
+    directory, file_name = os.path.split(image_name)
+    stem = os.path.splitext(file_name)[0]
+    return os.path.join(
+        directory, VARIANTS_DIR, f'{stem}_{variant}.{extension}'
+    )
+
+
+def variant_names(image_name):
+    return [
+        variant_name(image_name, variant, extension)
+        for variant in VARIANT_WIDTHS
+        for extension in FORMATS
+    ]
+
+
+def has_variants(image):
+    return all(
+        image.storage.exists(name) for name in variant_names(image.name)
+    )
+
+
+def delete_variants(storage, image_name):
+    for name in variant_names(image_name):
+        if storage.exists(name):
+            storage.delete(name)
+
+
+def generate_variants(image):
+    """Сохраняет уменьшенные копии изображения рецепта в WebP и JPEG.
+
+    Изображение не увеличивается: если оригинал уже меньше нужной
+    ширины, вариант сохраняется в исходном размере.
+    """
+    storage = image.storage
+    with storage.open(image.name) as original_file:
+        original = ImageOps.exif_transpose(Image.open(original_file))
+        original = original.convert('RGB')
+    for variant, width in VARIANT_WIDTHS.items():
+        resized = original.copy()
+        resized.thumbnail((width, width * 4), Image.LANCZOS)
+        for extension, (image_format, options) in FORMATS.items():
+            buffer = io.BytesIO()
+            resized.save(buffer, image_format, **options)
+            name = variant_name(image.name, variant, extension)
+            if storage.exists(name):
+                storage.delete(name)
+            storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def update_variants(recipe, generate=True):
+    """Создаёт копии текущей картинки рецепта, отмечает их готовыми
+    и удаляет копии прежней картинки."""
+    image_name = recipe.image.name
+    storage = recipe.image.storage
+    if generate:
+        generate_variants(recipe.image)
+    updated = type(recipe).objects.filter(
+        pk=recipe.pk, image=image_name
+    ).update(image_variants=image_name)
+    if not updated:
+        # Картинку успели заменить: копии уже никому не нужны.
+        delete_variants(storage, image_name)
+        return
+    if recipe.image_variants and recipe.image_variants != image_name:
+        delete_variants(storage, recipe.image_variants)
+    recipe.image_variants = image_name
@@ -0,0 +1,79 @@
+import csv
+import json
+from itertools import islice
+
+JSON_CHUNK_SIZE = 64 * 1024
+CSV_HEADER = ['name', 'measurement_unit']
+
+
+def read_json(file):
+    """Читает JSON-массив объектов по одному, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    while True:
+        chunk = file.read(JSON_CHUNK_SIZE)
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if not started and position < len(buffer):
+                if buffer[position] != '[':
+                    raise ValueError('Ожидается JSON-массив')
+                started = True
+                position += 1
+                continue
+            if position < len(buffer) and buffer[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise
+                break
+            yield item
+
+
+def read_csv(file):
+    """Читает строки «название,единица», заголовок необязателен."""
+    for row in csv.reader(file):
+        if not row or row == CSV_HEADER:
+            continue
+        name, measurement_unit = row
+        yield {'name': name, 'measurement_unit': measurement_unit}
+
+
+def get_new_rows(model, rows):
+    """Строки, которых ещё нет в базе и которые не повторяются в пачке."""
+    existing = set(model.objects.filter(
+        name__in={row['name'] for row in rows}
+    ).values_list('name', 'measurement_unit'))
+    new_rows = {}
+    for row in rows:
+        key = (row['name'], row['measurement_unit'])
+        if key not in existing:
+            new_rows.setdefault(key, row)
+    return list(new_rows.values())
+
+
+def load(model, rows, batch_size=1000):
+    """Добавляет ингредиенты пачками, пропуская уже существующие.
+
+    Возвращает число добавленных и пропущенных строк.
+    """
+    inserted = skipped = 0
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return inserted, skipped
+        new_rows = get_new_rows(model, batch)
+        # ignore_conflicts на случай, если те же строки одновременно
+        # добавляет кто-то ещё.
+        model.objects.bulk_create(
+            [model(**row) for row in new_rows], ignore_conflicts=True
+        )
+        inserted += len(new_rows)
+        skipped += len(batch) - len(new_rows)
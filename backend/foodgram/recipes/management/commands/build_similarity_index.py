@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+from recipes.similarity import index_recipes
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит индекс похожих рецептов (MinHash-подписи и корзины LSH) '
+        'для всех рецептов. Новые и изменённые рецепты индексируются '
+        'фоновой задачей recipes.index_similarity.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Число рецептов в одной транзакции'
+        )
+
+    def handle(self, *args, **options):
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        batch_size = options['batch_size']
+        indexed = 0
+        for start in range(0, len(recipe_ids), batch_size):
+            indexed += index_recipes(recipe_ids[start:start + batch_size])
+        self.stdout.write(
+            self.style.SUCCESS(f'Проиндексировано рецептов: {indexed}')
+        )
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import has_variants, update_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Создаёт уменьшенные копии картинок для уже загруженных рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересоздать копии, даже если они уже есть'
+        )
+
+    def handle(self, *args, **options):
+        created = skipped = failed = 0
+        recipes = Recipe.objects.only('id', 'image', 'image_variants')
+        for recipe in recipes.iterator():
+            if not recipe.image:
+                continue
+            ready = recipe.image_variants == recipe.image.name
+            if not options['force'] and ready:
+                skipped += 1
+                continue
+            try:
+                # Копии, созданные до появления отметки о готовности,
+                # только отмечаются.
+                update_variants(
+                    recipe,
+                    generate=options['force'] or not has_variants(
+                        recipe.image
+                    )
+                )
+            except (OSError, ValueError) as error:
+                failed += 1
+                self.stderr.write(f'Рецепт {recipe.id}: {error}')
+                continue
+            created += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано: {created}, пропущено: {skipped}, ошибок: {failed}'
+        ))
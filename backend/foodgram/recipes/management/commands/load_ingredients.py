@@ -0,0 +1,43 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.loaders import load, read_csv, read_json
+from recipes.models import Ingredient
+
+READERS = {
+    '.json': read_json,
+    '.csv': read_csv,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает справочник ингредиентов из JSON или CSV. '
+        'Уже существующие пары название/единица пропускаются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к .json или .csv файлу')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Число строк в одном INSERT'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        reader = READERS.get(os.path.splitext(path)[1].lower())
+        if reader is None:
+            raise CommandError('Поддерживаются только файлы .json и .csv')
+        try:
+            with open(path, encoding='utf-8', newline='') as file:
+                with transaction.atomic():
+                    inserted, skipped = load(
+                        Ingredient, reader(file), options['batch_size']
+                    )
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+        self.stdout.write(self.style.SUCCESS(
+            f'Добавлено: {inserted}, пропущено: {skipped}'
+        ))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes import feed
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересобирает ленты подписок по текущим подпискам: последние '
+        'FEED_BACKFILL_LIMIT рецептов каждого автора с fan-out on write.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='user_ids',
+            help='id пользователя; по умолчанию все, у кого есть подписки'
+        )
+
+    def handle(self, *args, **options):
+        user_ids = options['user_ids'] or CustomUser.objects.filter(
+            follower__isnull=False
+        ).distinct().values_list('id', flat=True)
+        feed.update_pull_authors()
+        users = entries = 0
+        for user_id in user_ids:
+            with transaction.atomic():
+                entries += feed.rebuild(user_id)
+            users += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Лент: {users}, записей: {entries}'
+        ))
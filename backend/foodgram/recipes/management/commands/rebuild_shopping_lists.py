@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересобирает таблицу итогов списков покупок по корзинам. '
+        'С --verify только сверяет таблицу и сообщает о расхождениях.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Не изменять данные, только проверить'
+        )
+
+    def get_stored(self):
+        return {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount
+            in ShoppingListItem.objects.values_list(
+                'user_id', 'ingredient_id', 'amount'
+            ).iterator()
+        }
+
+    def handle(self, *args, **options):
+        expected = ShoppingListItem.objects.calculate()
+        if options['verify']:
+            stored = self.get_stored()
+            mismatches = [
+                key for key in expected.keys() | stored.keys()
+                if expected.get(key) != stored.get(key)
+            ]
+            for user_id, ingredient_id in mismatches[:20]:
+                key = (user_id, ingredient_id)
+                self.stdout.write(
+                    f'user={user_id} ingredient={ingredient_id}: '
+                    f'ожидается {expected.get(key)}, '
+                    f'в таблице {stored.get(key)}'
+                )
+            if mismatches:
+                raise CommandError(f'Расхождений: {len(mismatches)}')
+            self.stdout.write(self.style.SUCCESS('Расхождений нет'))
+            return
+        with transaction.atomic():
+            ShoppingListItem.objects.all().delete()
+            ShoppingListItem.objects.bulk_create(
+                (
+                    ShoppingListItem(
+                        user_id=user_id,
+                        ingredient_id=ingredient_id,
+                        amount=amount
+                    )
+                    for (user_id, ingredient_id), amount in expected.items()
+                )
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f'Записано строк: {len(expected)}')
+        )
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import FavoriteRecipe, Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет счётчик favorites_count рецептов с таблицей избранного '
+        'и исправляет расхождения. С --verify только сообщает о них.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Не изменять данные, только проверить'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            expected = FavoriteRecipe.objects.calculate()
+            mismatched = [
+                recipe
+                for recipe in Recipe.objects.select_for_update().only(
+                    'id', 'favorites_count'
+                ).iterator()
+                if recipe.favorites_count != expected.get(recipe.id, 0)
+            ]
+            for recipe in mismatched[:20]:
+                self.stdout.write(
+                    f'recipe={recipe.id}: '
+                    f'ожидается {expected.get(recipe.id, 0)}, '
+                    f'в таблице {recipe.favorites_count}'
+                )
+            if options['verify']:
+                if mismatched:
+                    raise CommandError(f'Расхождений: {len(mismatched)}')
+                self.stdout.write(self.style.SUCCESS('Расхождений нет'))
+                return
+            for recipe in mismatched:
+                recipe.favorites_count = expected.get(recipe.id, 0)
+            Recipe.objects.bulk_update(
+                mismatched, ['favorites_count'], batch_size=1000
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f'Исправлено рецептов: {len(mismatched)}')
+        )
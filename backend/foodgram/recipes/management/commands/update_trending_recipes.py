@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import TrendingRecipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает таблицу популярных рецептов. Обычно это делает '
+        'периодическая задача recipes.update_trending в run_jobs.'
+    )
+
+    def handle(self, *args, **options):
+        count = TrendingRecipe.objects.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Рецептов в рейтинге: {count}'))
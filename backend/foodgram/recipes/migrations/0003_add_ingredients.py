@@ -1,4 +1,3 @@
-import json
 import os.path
 
 from django.db import migrations
@@ -6,18 +5,16 @@ from foodgram.settings import BASE_DIR
 
 json_name = 'ingredients.json'
 location_json = os.path.join(
-            json_name
+            BASE_DIR, json_name
         )
 
-with open(location_json, encoding='utf-8') as json_file:
-    json_data = json.load(json_file)
-
 
 def add_ingredients(apps, schema_editor):
+    from recipes.loaders import load, read_json
+
     Ingredient = apps.get_model('recipes', 'Ingredient')
-    for ingredient in json_data:
-        new_ingredient = Ingredient(**ingredient)
-        new_ingredient.save()
+    with open(location_json, encoding='utf-8') as json_file:
+        load(Ingredient, read_json(json_file))
 
 
 class Migration(migrations.Migration):
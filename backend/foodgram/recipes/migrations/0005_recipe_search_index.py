@@ -0,0 +1,63 @@
+from django.db import migrations
+
+INGREDIENT_NAMES_SQL = (
+    'SELECT {aggregate} FROM recipes_ingredientwithamount amount '
+    'JOIN recipes_ingredient ingredient '
+    'ON ingredient.id = amount.ingredient_id '
+    'WHERE amount.recipe_id = recipes_recipe.id'
+)
+
+FORWARD_SQL = {
+    'sqlite': (
+        "CREATE VIRTUAL TABLE recipes_recipe_fts USING fts5("
+        "name, ingredients, text, tokenize='unicode61 remove_diacritics 2')",
+        'INSERT INTO recipes_recipe_fts(rowid, name, ingredients, text) '
+        'SELECT id, name, ({}), text FROM recipes_recipe'.format(
+            INGREDIENT_NAMES_SQL.format(
+                aggregate="group_concat(ingredient.name, ' ')"
+            )
+        ),
+    ),
+    'postgresql': (
+        'ALTER TABLE recipes_recipe ADD COLUMN search_vector tsvector',
+        'CREATE INDEX recipes_recipe_search_vector_idx '
+        'ON recipes_recipe USING GIN (search_vector)',
+        "UPDATE recipes_recipe SET search_vector = "
+        "setweight(to_tsvector('russian', name), 'A') || "
+        "setweight(to_tsvector('russian', coalesce(({}), '')), 'B') || "
+        "setweight(to_tsvector('russian', text), 'C')".format(
+            INGREDIENT_NAMES_SQL.format(
+                aggregate="string_agg(ingredient.name, ' ')"
+            )
+        ),
+    ),
+}
+
+BACKWARD_SQL = {
+    'sqlite': ('DROP TABLE recipes_recipe_fts',),
+    'postgresql': (
+        'ALTER TABLE recipes_recipe DROP COLUMN search_vector',
+    ),
+}
+
+
+def run_vendor_sql(statements):
+    def run(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        for statement in statements.get(vendor, ()):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_add_tags'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_vendor_sql(FORWARD_SQL),
+            run_vendor_sql(BACKWARD_SQL),
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_pull_authors(apps, schema_editor):
+    Follow = apps.get_model('users', 'Follow')
+    FeedPullAuthor = apps.get_model('recipes', 'FeedPullAuthor')
+    author_ids = Follow.objects.order_by().values('author').annotate(
+        followers=models.Count('id')
+    ).filter(
+        followers__gt=settings.FEED_FANOUT_LIMIT
+    ).values_list('author', flat=True)
+    FeedPullAuthor.objects.bulk_create(
+        FeedPullAuthor(author_id=author_id) for author_id in author_ids
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_customuser_ordering'),
+        ('recipes', '0012_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedPullAuthor',
+            fields=[
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='feed_pull', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+            ],
+            options={
+                'verbose_name': 'Автор с лентой без раскладки',
+                'verbose_name_plural': 'Авторы с лентой без раскладки',
+            },
+        ),
+        migrations.RunPython(fill_pull_authors, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,12 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import (Case, Count, F, IntegerField, Sum, Value,
+                              When)
+from django.utils import timezone
 
 from users.models import CustomUser
 
@@ -71,11 +78,38 @@ class Recipe(models.Model):
     pub_date = models.DateTimeField(
         'Дата публикации',
         auto_now_add=True)
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном'
+    )
+    # Картинка, для которой созданы уменьшенные копии. Копии готовы,
+    # если значение совпадает с image.
+    image_variants = models.CharField(
+        max_length=100,
+        blank=True,
+        editable=False,
+        verbose_name='Картинка с готовыми копиями'
+    )
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=['-favorites_count', '-id'],
+                name='recipe_favorites_count_id_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='recipe_author_pub_date_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -139,6 +173,20 @@ class IngredientWithAmount(models.Model):
         return f'{self.recipe} - {self.ingredient}'
 
 
+class FavoriteRecipeManager(models.Manager):
+
+    def change_count(self, recipe_id, delta):
+        Recipe.objects.filter(pk=recipe_id).update(
+            favorites_count=F('favorites_count') + delta
+        )
+
+    def calculate(self):
+        """Число добавлений в избранное, посчитанное заново."""
+        return dict(self.values('recipe').order_by().annotate(
+            total=Count('id')
+        ).values_list('recipe', 'total'))
+
+
 class FavoriteRecipe(models.Model):
     user = models.ForeignKey(
         User,
@@ -150,6 +198,13 @@ class FavoriteRecipe(models.Model):
         related_name='users_favorites',
         on_delete=models.CASCADE,
     )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Добавлен'
+    )
+
+    objects = FavoriteRecipeManager()
 
     class Meta:
         verbose_name = 'Избранный рецепт'
@@ -179,6 +234,11 @@ class ShoppingCart(models.Model):
         related_name='shopping_cart',
         verbose_name='Покупка'
     )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Добавлен'
+    )
 
     class Meta:
         verbose_name = 'Покупка'
@@ -192,3 +252,289 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f' {self.user} добавил {self.recipe} в корзину'
+
+
+class ShoppingListItemManager(models.Manager):
+
+    @transaction.atomic
+    def apply(self, user_ids, deltas):
+        """Прибавляет deltas ({id ингредиента: количество}) к итогам
+        пользователей и удаляет обнулившиеся строки."""
+        user_ids = list(user_ids)
+        deltas = {pk: delta for pk, delta in deltas.items() if delta}
+        if not user_ids or not deltas:
+            return
+        self.bulk_create([
+            self.model(user_id=user_id, ingredient_id=ingredient_id, amount=0)
+            for user_id in user_ids
+            for ingredient_id in deltas
+        ], ignore_conflicts=True)
+        rows = self.filter(user_id__in=user_ids, ingredient_id__in=deltas)
+        rows.update(amount=F('amount') + Case(
+            *[When(ingredient_id=pk, then=Value(delta))
+              for pk, delta in deltas.items()],
+            output_field=IntegerField()
+        ))
+        rows.filter(amount__lte=0).delete()
+
+    def get_recipe_amounts(self, recipe):
+        return dict(IngredientWithAmount.objects.filter(
+            recipe=recipe
+        ).values_list('ingredient_id', 'amount'))
+
+    def change_cart(self, user_id, recipe, sign):
+        """Прибавляет (sign=1) рецепт к итогам пользователя или вычитает
+        (sign=-1) его из них."""
+        amounts = self.get_recipe_amounts(recipe)
+        self.apply(
+            [user_id], {pk: sign * amount for pk, amount in amounts.items()}
+        )
+
+    def change_ingredient(self, recipe, ingredient_id, delta):
+        """Переносит изменение одной строки состава во все корзины
+        с этим рецептом."""
+        self.apply(self.get_cart_user_ids(recipe), {ingredient_id: delta})
+
+    def get_cart_user_ids(self, recipe):
+        return list(ShoppingCart.objects.filter(recipe=recipe).values_list(
+            'user_id', flat=True
+        ))
+
+    def change_recipe(self, recipe, old_amounts, new_amounts):
+        """Переносит изменение состава рецепта в корзины с этим рецептом."""
+        deltas = {
+            pk: new_amounts.get(pk, 0) - old_amounts.get(pk, 0)
+            for pk in old_amounts.keys() | new_amounts.keys()
+        }
+        if any(deltas.values()):
+            self.apply(self.get_cart_user_ids(recipe), deltas)
+
+    def calculate(self):
+        """Итоги, посчитанные заново по корзинам."""
+        return {
+            (row['recipe__shopping_cart__user'], row['ingredient']):
+                row['total']
+            for row in IngredientWithAmount.objects.filter(
+                recipe__shopping_cart__user__isnull=False
+            ).values(
+                'recipe__shopping_cart__user', 'ingredient'
+            ).order_by().annotate(total=Sum('amount'))
+        }
+
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Ингредиент'
+    )
+    amount = models.IntegerField(
+        default=0,
+        verbose_name='Количество'
+    )
+
+    objects = ShoppingListItemManager()
+
+    class Meta:
+        verbose_name = 'Итог списка покупок'
+        verbose_name_plural = 'Итоги списков покупок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_item',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient} - {self.amount}'
+
+
+class TrendingRecipeManager(models.Manager):
+
+    def calculate(self, now=None):
+        """Оценки рецептов по добавлениям в избранное и корзину за окно
+        TRENDING_WINDOW. Вклад события убывает вдвое каждые
+        TRENDING_HALF_LIFE."""
+        now = now or timezone.now()
+        window = timedelta(seconds=settings.TRENDING_WINDOW)
+        half_life = settings.TRENDING_HALF_LIFE
+        scores = defaultdict(float)
+        for model, weight in (
+            (FavoriteRecipe, settings.TRENDING_FAVORITE_WEIGHT),
+            (ShoppingCart, settings.TRENDING_CART_WEIGHT),
+        ):
+            events = model.objects.filter(
+                created__gte=now - window
+            ).values_list('recipe_id', 'created').iterator()
+            for recipe_id, created in events:
+                age = (now - created).total_seconds()
+                scores[recipe_id] += weight * 0.5 ** (age / half_life)
+        return scores
+
+    @transaction.atomic
+    def rebuild(self, now=None):
+        """Пересчитывает таблицу: TRENDING_LIMIT лучших рецептов."""
+        scores = self.calculate(now)
+        top = sorted(
+            scores.items(), key=lambda item: (-item[1], -item[0])
+        )[:settings.TRENDING_LIMIT]
+        self.all().delete()
+        self.bulk_create(
+            self.model(recipe_id=recipe_id, score=score, rank=rank)
+            for rank, (recipe_id, score) in enumerate(top, 1)
+        )
+        return len(top)
+
+
+class TrendingRecipe(models.Model):
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trending',
+        verbose_name='Рецепт'
+    )
+    score = models.FloatField(
+        verbose_name='Оценка'
+    )
+    rank = models.PositiveIntegerField(
+        unique=True,
+        verbose_name='Место'
+    )
+
+    objects = TrendingRecipeManager()
+
+    class Meta:
+        verbose_name = 'Популярный рецепт'
+        verbose_name_plural = 'Популярные рецепты'
+        ordering = ['rank']
+
+    def __str__(self):
+        return f'{self.rank}. {self.recipe}'
+
+
+class FeedEntry(models.Model):
+    """Рецепт в ленте подписчика автора (fan-out on write)."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='Подписчик'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации'
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи лент'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_feed_entry',
+            ),
+        )
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-recipe'],
+                name='feed_user_pub_date_idx'
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='feed_user_author_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.recipe}'
+
+
+class RecipeSignature(models.Model):
+    """MinHash-подпись набора ингредиентов рецепта."""
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='signature',
+        verbose_name='Рецепт'
+    )
+    signature = models.BinaryField(
+        verbose_name='Подпись'
+    )
+
+    class Meta:
+        verbose_name = 'Подпись рецепта'
+        verbose_name_plural = 'Подписи рецептов'
+
+    def __str__(self):
+        return f'{self.recipe_id}'
+
+
+class RecipeBucket(models.Model):
+    """Корзина LSH: рецепты с совпадающей полосой подписи."""
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='buckets',
+        verbose_name='Рецепт'
+    )
+    band = models.PositiveSmallIntegerField(
+        verbose_name='Полоса'
+    )
+    bucket = models.BigIntegerField(
+        verbose_name='Хеш полосы'
+    )
+
+    class Meta:
+        verbose_name = 'Корзина LSH'
+        verbose_name_plural = 'Корзины LSH'
+        indexes = [
+            models.Index(
+                fields=['band', 'bucket'],
+                name='recipe_bucket_band_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.band}/{self.bucket}'
+
+
+class FeedPullAuthor(models.Model):
+    """Автор, у которого подписчиков больше FEED_FANOUT_LIMIT.
+
+    Его рецепты не раскладываются по лентам, а читаются при запросе
+    ленты напрямую (fan-out on read). Список пересчитывает периодическая
+    задача recipes.update_feed_pull_authors.
+    """
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='feed_pull',
+        verbose_name='Автор'
+    )
+
+    class Meta:
+        verbose_name = 'Автор с лентой без раскладки'
+        verbose_name_plural = 'Авторы с лентой без раскладки'
+
+    def __str__(self):
+        return str(self.author)
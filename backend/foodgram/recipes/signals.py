@@ -0,0 +1,66 @@
+"""Итоги списков покупок меняются вместе с корзинами и составом рецептов
+на любом пути: через API, админку и каскадное удаление.
+
+Пара «корзина — строка состава» вычитается из итогов, когда удаляется
+первая из двух записей: вторая в этот момент ещё есть в базе. Поэтому
+при удалении рецепта или пользователя ничего не вычитается дважды.
+"""
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import IngredientWithAmount, ShoppingCart, ShoppingListItem
+
+
+@receiver(pre_save, sender=ShoppingCart)
+def remove_previous_cart(instance, **kwargs):
+    if instance.pk is None:
+        return
+    previous = ShoppingCart.objects.filter(pk=instance.pk).values_list(
+        'user_id', 'recipe_id'
+    ).first()
+    if previous is not None and previous[0] is not None:
+        ShoppingListItem.objects.change_cart(previous[0], previous[1], -1)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_cart(instance, **kwargs):
+    if instance.user_id is not None:
+        ShoppingListItem.objects.change_cart(
+            instance.user_id, instance.recipe_id, 1
+        )
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def remove_cart(instance, **kwargs):
+    if instance.user_id is not None:
+        ShoppingListItem.objects.change_cart(
+            instance.user_id, instance.recipe_id, -1
+        )
+
+
+@receiver(pre_save, sender=IngredientWithAmount)
+def remove_previous_amount(instance, **kwargs):
+    if instance.pk is None:
+        return
+    previous = IngredientWithAmount.objects.filter(
+        pk=instance.pk
+    ).values_list('recipe_id', 'ingredient_id', 'amount').first()
+    if previous is not None:
+        recipe_id, ingredient_id, amount = previous
+        ShoppingListItem.objects.change_ingredient(
+            recipe_id, ingredient_id, -amount
+        )
+
+
+@receiver(post_save, sender=IngredientWithAmount)
+def add_amount(instance, **kwargs):
+    ShoppingListItem.objects.change_ingredient(
+        instance.recipe_id, instance.ingredient_id, instance.amount
+    )
+
+
+@receiver(post_delete, sender=IngredientWithAmount)
+def remove_amount(instance, **kwargs):
+    ShoppingListItem.objects.change_ingredient(
+        instance.recipe_id, instance.ingredient_id, -instance.amount
+    )
@@ -0,0 +1,115 @@
+"""Похожие рецепты по набору ингредиентов: MinHash и LSH.
+
+Подпись рецепта — SIMILAR_RECIPES_PERMUTATIONS минимумов хеш-функций
+по id ингредиентов; доля совпавших позиций двух подписей оценивает
+коэффициент Жаккара их наборов. Подпись режется на SIMILAR_RECIPES_BANDS
+полос, хеш каждой полосы — ключ корзины. Кандидаты в похожие — рецепты,
+хотя бы в одной корзине с исходным, их немного и они ищутся по индексу.
+Из кандидатов сначала берутся те, что делят с исходным больше корзин.
+"""
+import hashlib
+import random
+from array import array
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .models import IngredientWithAmount, RecipeBucket, RecipeSignature
+
+PRIME = (1 << 61) - 1
+SEED = 20221017
+
+
+@lru_cache(maxsize=None)
+def get_permutations(count):
+    generator = random.Random(SEED)
+    return [
+        (generator.randrange(1, PRIME), generator.randrange(PRIME))
+        for _ in range(count)
+    ]
+
+
+def get_signature(ingredient_ids):
+    return array('Q', (
+        min((a * pk + b) % PRIME for pk in ingredient_ids)
+        for a, b in get_permutations(settings.SIMILAR_RECIPES_PERMUTATIONS)
+    ))
+
+
+def get_buckets(signature):
+    rows = len(signature) // settings.SIMILAR_RECIPES_BANDS
+    for band in range(settings.SIMILAR_RECIPES_BANDS):
+        digest = hashlib.blake2b(
+            signature[band * rows:(band + 1) * rows].tobytes(),
+            digest_size=8
+        ).digest()
+        yield band, int.from_bytes(digest, 'big', signed=True)
+
+
+def load_signature(data):
+    signature = array('Q')
+    signature.frombytes(bytes(data))
+    return signature
+
+
+def get_ingredient_sets(recipe_ids):
+    ingredient_sets = {pk: set() for pk in recipe_ids}
+    for recipe_id, ingredient_id in IngredientWithAmount.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('recipe_id', 'ingredient_id').iterator():
+        ingredient_sets[recipe_id].add(ingredient_id)
+    return ingredient_sets
+
+
+@transaction.atomic
+def index_recipes(recipe_ids):
+    """Пересчитывает подписи и корзины рецептов."""
+    recipe_ids = list(recipe_ids)
+    RecipeSignature.objects.filter(recipe_id__in=recipe_ids).delete()
+    RecipeBucket.objects.filter(recipe_id__in=recipe_ids).delete()
+    signatures = []
+    buckets = []
+    for recipe_id, ingredient_ids in get_ingredient_sets(recipe_ids).items():
+        if not ingredient_ids:
+            continue
+        signature = get_signature(ingredient_ids)
+        signatures.append(RecipeSignature(
+            recipe_id=recipe_id, signature=signature.tobytes()
+        ))
+        buckets.extend(
+            RecipeBucket(recipe_id=recipe_id, band=band, bucket=bucket)
+            for band, bucket in get_buckets(signature)
+        )
+    RecipeSignature.objects.bulk_create(signatures)
+    RecipeBucket.objects.bulk_create(buckets)
+    return len(signatures)
+
+
+def get_similar_recipe_ids(recipe_id, limit):
+    """id до limit рецептов, ближайших к данному, по убыванию сходства."""
+    data = RecipeSignature.objects.filter(recipe_id=recipe_id).values_list(
+        'signature', flat=True
+    ).first()
+    if data is None:
+        return []
+    signature = load_signature(data)
+    condition = Q()
+    for band, bucket in get_buckets(signature):
+        condition |= Q(band=band, bucket=bucket)
+    candidate_ids = RecipeBucket.objects.filter(condition).exclude(
+        recipe_id=recipe_id
+    ).values('recipe_id').annotate(
+        shared=Count('id')
+    ).order_by('-shared', 'recipe_id').values_list('recipe_id', flat=True)
+    candidates = RecipeSignature.objects.filter(
+        recipe_id__in=candidate_ids[:settings.SIMILAR_RECIPES_CANDIDATES]
+    ).values_list('recipe_id', 'signature')
+    scores = []
+    for candidate_id, candidate_data in candidates:
+        candidate = load_signature(candidate_data)
+        matches = sum(a == b for a, b in zip(signature, candidate))
+        scores.append((matches, candidate_id))
+    scores.sort(reverse=True)
+    return [candidate_id for _, candidate_id in scores[:limit]]
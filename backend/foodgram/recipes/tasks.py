@@ -0,0 +1,50 @@
+from jobs.registry import job
+from . import feed, similarity
+from .images import update_variants
+from .models import Recipe, TrendingRecipe
+
+
+@job('recipes.generate_image_variants')
+def generate_image_variants(recipe_id):
+    recipe = Recipe.objects.filter(pk=recipe_id).first()
+    if recipe is None or not recipe.image:
+        return None
+    update_variants(recipe)
+    return {'recipe': recipe_id}
+
+
+@job('recipes.generate_image_variants_batch')
+def generate_image_variants_batch(recipe_ids):
+    recipes = Recipe.objects.filter(pk__in=recipe_ids).only(
+        'image', 'image_variants'
+    )
+    for recipe in recipes:
+        if recipe.image:
+            update_variants(recipe)
+    return {'recipes': recipe_ids}
+
+
+@job('recipes.update_trending', max_attempts=1)
+def update_trending():
+    return {'recipes': TrendingRecipe.objects.rebuild()}
+
+
+@job('recipes.fan_out_recipes')
+def fan_out_recipes(recipe_ids):
+    return {'entries': feed.fan_out(recipe_ids)}
+
+
+@job('recipes.update_feed_pull_authors', max_attempts=1)
+def update_feed_pull_authors():
+    added, removed = feed.update_pull_authors()
+    return {'added': added, 'removed': removed}
+
+
+@job('recipes.backfill_feed')
+def backfill_feed(user_id, author_id):
+    return {'entries': feed.backfill(user_id, author_id)}
+
+
+@job('recipes.index_similarity')
+def index_similarity(recipe_ids):
+    return {'recipes': similarity.index_recipes(recipe_ids)}
@@ -1,10 +1,11 @@
 from django.contrib import admin
 from django.contrib.auth.models import Group
 
+from foodgram.paginators import LargeTableAdminMixin
 from .models import Follow, User
 
 
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = (
         'pk',
         'username',
@@ -14,17 +15,18 @@ class UserAdmin(admin.ModelAdmin):
     )
     ordering = ('email',)
     search_fields = ('username', 'email', 'last_name')
-    list_filter = ('username', 'email', 'first_name', 'last_name')
+    list_filter = ('is_staff', 'is_active')
 
 
-class SubscriptionAdmin(admin.ModelAdmin):
+class SubscriptionAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = (
         'pk',
         'user',
         'author'
     )
-    list_filter = ('user', 'author')
     search_fields = ('user__username', 'user__email')
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
 
 
 admin.site.unregister(Group)